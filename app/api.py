@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+import tornado.ioloop
+import tornado.web
+
+from app import http_client
+from app.poster_generator import create_poster
+from app.poster_output import ENCODERS, POSTER_FORMAT, POSTER_QUALITY
+from app.prefetch import PREFETCH_TTL, start_prefetch
+from app.stats import yearly_summary
+from app.tracing import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Headless JSON API over the same diary loads, stats and story posters the
+# Streamlit app uses, for clients that don't need a UI session:
+#   python -m app.api --port 8502
+#   GET /api/users/<username>                       years in the diary
+#   GET /api/users/<username>/<year>                that year's stats
+#   GET /api/users/<username>/<year>/story?format=png8&quality=85
+# Loads and renders run on a thread pool, off the event loop. Finished
+# responses are kept for API_CACHE_TTL and carry an ETag, so repeat requests
+# are answered from memory, or with a 304. Cache-Control lets a CDN in front
+# of the API do the same. Identical requests arriving together share one build.
+API_PORT = int(os.getenv('API_PORT', 8502))
+API_WORKERS = int(os.getenv('API_WORKERS', 8))
+API_CACHE_SIZE = int(os.getenv('API_CACHE_SIZE', 512))
+API_CACHE_TTL = float(os.getenv('API_CACHE_TTL', PREFETCH_TTL))
+API_MAX_AGE = int(os.getenv('API_MAX_AGE', 300))
+
+USERNAME_PATTERN = r'[A-Za-z0-9_-]+'
+
+Response = namedtuple('Response', ['body', 'content_type', 'etag', 'created'])
+
+
+def make_response(body, content_type):
+    return Response(body, content_type, hashlib.sha1(body).hexdigest(), time.monotonic())
+
+
+def json_response(value):
+    return make_response(json.dumps(value, separators=(',', ':')).encode(), 'application/json')
+
+
+class ResponseCache:
+    def __init__(self, max_entries=API_CACHE_SIZE, ttl=API_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None and time.monotonic() - response.created > self.ttl:
+                del self._entries[key]
+                response = None
+            if response is not None:
+                self._entries.move_to_end(key)
+        record_cache('api', response is not None)
+        return response
+
+    def put(self, key, response):
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
+_builds = http_client.SingleFlight()
+_executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix='api')
+
+
+def load_diary(username, year=None):
+    # the year only picks which year's posters the load warms
+    job = start_prefetch(username, year or datetime.now().year).wait()
+    if year is not None and year not in job.years:
+        raise tornado.web.HTTPError(404, reason=f'No diary entries for {year}')
+    return job
+
+
+def build_years(username):
+    job = load_diary(username)
+    summary_df = yearly_summary(job.year_stats(year) for year in job.years)
+    return json_response({'username': username, 'years': summary_df.to_dict(orient='records')})
+
+
+def build_stats(username, year):
+    return json_response({'username': username, **load_diary(username, year).year_stats(year).to_dict()})
+
+
+def build_story(username, year, fmt, quality):
+    job = load_diary(username, year)
+    stats = job.year_stats(year)
+    poster = create_poster(username, job.year_frame(year), year, stats.top3, stats=stats, fmt=fmt, quality=quality)
+    return make_response(poster.getvalue(), ENCODERS[fmt].mime)
+
+
+def cached_build(key, build, *args):
+    response = response_cache.get(key)
+    if response is None:
+        response = build(*args)
+        response_cache.put(key, response)
+    return response
+
+
+class CachedHandler(tornado.web.RequestHandler):
+    async def respond(self, key, build, *args):
+        response = response_cache.get(key)
+        if response is None:
+            try:
+                response = await tornado.ioloop.IOLoop.current().run_in_executor(
+                    _executor, _builds.do, key, lambda: cached_build(key, build, *args))
+            except requests.HTTPError as e:
+                # the feed itself failed; Letterboxd answers unknown users with a 404
+                status = e.response.status_code if e.response is not None else None
+                raise tornado.web.HTTPError(404 if status == 404 else 502, reason='Could not read the diary feed')
+        self.set_header('Content-Type', response.content_type)
+        self.set_header('Cache-Control', f'public, max-age={API_MAX_AGE}')
+        self.set_header('Etag', f'"{response.etag}"')
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        self.write(response.body)
+
+    def write_error(self, status_code, **kwargs):
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps({'error': self._reason}))
+
+
+class YearsHandler(CachedHandler):
+    async def get(self, username):
+        await self.respond(('years', username.lower()), build_years, username)
+
+
+class StatsHandler(CachedHandler):
+    async def get(self, username, year):
+        await self.respond(('stats', username.lower(), int(year)), build_stats, username, int(year))
+
+
+class StoryHandler(CachedHandler):
+    async def get(self, username, year):
+        fmt = self.get_query_argument('format', POSTER_FORMAT)
+        if fmt not in ENCODERS:
+            raise tornado.web.HTTPError(400, reason=f'format must be one of {", ".join(ENCODERS)}')
+        try:
+            quality = int(self.get_query_argument('quality', str(POSTER_QUALITY)))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason='quality must be a number')
+        if not 1 <= quality <= 100:
+            raise tornado.web.HTTPError(400, reason='quality must be between 1 and 100')
+        await self.respond(('story', username.lower(), int(year), fmt, quality), build_story,
+                           username, int(year), fmt, quality)
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.write({'status': 'ok'})
+
+
+def make_app():
+    return tornado.web.Application([
+        (rf'/api/users/({USERNAME_PATTERN})', YearsHandler),
+        (rf'/api/users/({USERNAME_PATTERN})/(\d{{4}})', StatsHandler),
+        (rf'/api/users/({USERNAME_PATTERN})/(\d{{4}})/story', StoryHandler),
+        (r'/healthz', HealthHandler),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON stats and story API')
+    parser.add_argument('--port', type=int, default=API_PORT)
+    parser.add_argument('--address', default='')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    make_app().listen(args.port, address=args.address)
+    logger.info('Serving the stats API on port %s', args.port)
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    main()
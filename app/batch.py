@@ -0,0 +1,180 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from app.diary_store import load_user_year
+from app.files import atomic_write
+from app.fonts import preload_fonts
+from app.movie_data import get_movie_data_from_rss_file
+from app.poster_generator import create_poster
+from app.poster_output import ENCODERS, POSTER_FORMAT, POSTER_QUALITY
+from app.stats import YearInFilmStats
+from app.tracing import TRACING_ENABLED, metrics
+
+# Headless year-in-film story generation for many users:
+#   python -m app.batch --year 2024 --usernames-file users.txt --out stories/
+# Feeds and TMDB lookups go through the shared on-disk caches, posters are
+# rendered across a process pool, and manifest.json records every user so an
+# interrupted run picks up where it stopped.
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_SAVE_EVERY = 50
+
+
+def story_filename(username, year, fmt=POSTER_FORMAT):
+    return re.sub(r'[^A-Za-z0-9_-]', '_', f'{username}s_{year}_in_film') + f'.{ENCODERS[fmt].extension}'
+
+
+def load_manifest(path, year):
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get('year') == year:
+            return manifest
+    return {'year': year, 'users': {}}
+
+
+def save_manifest(path, manifest):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    atomic_write(path, write)
+
+
+def fetch_user_stats(username, year, feed_dir=None):
+    start = time.perf_counter()
+    if feed_dir:
+        movie_df = get_movie_data_from_rss_file(os.path.join(feed_dir, f'{username}.xml'), year)
+    else:
+        movie_df = load_user_year(username, year)
+    return YearInFilmStats.from_frame(movie_df, year), time.perf_counter() - start
+
+
+def render_story(username, year, stats, out_dir, theme='default', fmt=POSTER_FORMAT, quality=POSTER_QUALITY):
+    start = time.perf_counter()
+    # every story is written to out_dir once, the shared story cache would only duplicate it
+    poster = create_poster(username, None, year, stats.top3, stats=stats, theme=theme,
+                           fmt=fmt, quality=quality, cache=False).getvalue()
+    path = os.path.join(out_dir, story_filename(username, year, fmt))
+    with open(path, 'wb') as f:
+        f.write(poster)
+    return path, len(poster), time.perf_counter() - start
+
+
+def pending_usernames(usernames, manifest, out_dir, resume=True):
+    if not resume:
+        return list(dict.fromkeys(usernames))
+    done = {
+        username for username, entry in manifest['users'].items()
+        if entry.get('status') == 'ok' and os.path.exists(os.path.join(out_dir, entry['file']))
+    }
+    return [username for username in dict.fromkeys(usernames) if username not in done]
+
+
+def run_batch(usernames, year, out_dir, feed_dir=None, workers=None, fetch_workers=8, resume=True,
+              theme='default', fmt=POSTER_FORMAT, quality=POSTER_QUALITY, log=print):
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path, year)
+    todo = pending_usernames(usernames, manifest, out_dir, resume)
+    summary = {'requested': len(usernames), 'skipped': len(set(usernames)) - len(todo), 'ok': 0, 'failed': 0,
+               'fetch_seconds': 0.0, 'render_seconds': 0.0, 'bytes': 0}
+    log(f'{len(todo)} users to render, {summary["skipped"]} already done')
+
+    start = time.perf_counter()
+    completed = 0
+    # spawn, not fork: the parent holds fetch threads and sqlite connections
+    context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=preload_fonts) as render_pool:
+        labels = {fetch_pool.submit(fetch_user_stats, username, year, feed_dir): ('fetch', username) for username in todo}
+        pending = set(labels)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, username = labels.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        manifest['users'][username] = {'status': 'failed', 'stage': stage, 'error': repr(e)}
+                        summary['failed'] += 1
+                    else:
+                        if stage == 'fetch':
+                            stats, fetch_seconds = result
+                            summary['fetch_seconds'] += fetch_seconds
+                            render = render_pool.submit(render_story, username, year, stats, out_dir, theme, fmt, quality)
+                            labels[render] = ('render', username)
+                            pending.add(render)
+                            manifest['users'][username] = {'status': 'fetched', 'entries': stats.entries,
+                                                           'fetch_seconds': round(fetch_seconds, 3)}
+                            continue
+                        path, size, render_seconds = result
+                        summary['ok'] += 1
+                        summary['render_seconds'] += render_seconds
+                        summary['bytes'] += size
+                        manifest['users'][username].update({'status': 'ok', 'file': os.path.basename(path),
+                                                            'bytes': size, 'render_seconds': round(render_seconds, 3)})
+                    completed += 1
+                    if completed % MANIFEST_SAVE_EVERY == 0:
+                        save_manifest(manifest_path, manifest)
+                        elapsed = time.perf_counter() - start
+                        log(f'{completed}/{len(todo)} done, {completed / elapsed:.1f} users/s')
+        finally:
+            save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    summary['elapsed_seconds'] = elapsed
+    summary['users_per_second'] = completed / elapsed if elapsed else 0.0
+    return summary
+
+
+def read_usernames(args):
+    usernames = list(args.usernames)
+    if args.usernames_file:
+        with open(args.usernames_file) as f:
+            usernames += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return usernames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render year-in-film stories for many Letterboxd users')
+    parser.add_argument('usernames', nargs='*')
+    parser.add_argument('--usernames-file', help='one username per line')
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--out', default='stories', help='directory for the PNGs and manifest.json')
+    parser.add_argument('--feed-dir', help='read <username>.xml feeds from this directory instead of Letterboxd')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='render processes')
+    parser.add_argument('--fetch-workers', type=int, default=8, help='users fetched concurrently')
+    parser.add_argument('--theme', default='default')
+    parser.add_argument('--format', default=POSTER_FORMAT, choices=sorted(ENCODERS), help='story image encoding')
+    parser.add_argument('--quality', type=int, default=POSTER_QUALITY, help='webp/jpeg quality')
+    parser.add_argument('--no-resume', action='store_true', help='re-render users already in the manifest')
+    parser.add_argument('--metrics-file', help='write Prometheus-format timings here (needs LETTERBOXDBI_TRACING=1)')
+    args = parser.parse_args()
+
+    usernames = read_usernames(args)
+    if not usernames:
+        parser.error('no usernames given')
+
+    summary = run_batch(usernames, args.year, args.out, feed_dir=args.feed_dir, workers=args.workers,
+                        fetch_workers=args.fetch_workers, resume=not args.no_resume, theme=args.theme,
+                        fmt=args.format, quality=args.quality)
+    print(f"rendered {summary['ok']}, failed {summary['failed']}, skipped {summary['skipped']} "
+          f"in {summary['elapsed_seconds']:.1f}s ({summary['users_per_second']:.2f} users/s); "
+          f"fetch {summary['fetch_seconds']:.1f}s, render {summary['render_seconds']:.1f}s cumulative, "
+          f"{summary['bytes'] / 1e6:.1f} MB written")
+    if args.metrics_file:
+        if not TRACING_ENABLED:
+            print('LETTERBOXDBI_TRACING is off, metrics file will be empty')
+        # renders run in worker processes, so this covers fetch and enrichment only
+        with open(args.metrics_file, 'w') as f:
+            f.write(metrics.prometheus_text())
+
+
+if __name__ == '__main__':
+    main()
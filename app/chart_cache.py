@@ -0,0 +1,51 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from app.tracing import record_cache
+
+# Rendered chart output (treemap PNG bytes, Altair/Vega-Lite JSON specs) keyed
+# by a hash of the aggregates that went into it, so a Streamlit rerun with
+# unchanged data does no plotting work. Shared by every session in the process.
+CHART_CACHE_SIZE = 256
+
+
+def aggregate_key(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, (pd.Series, pd.DataFrame)):
+            part = part.to_json()
+        h.update(repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_entries=CHART_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, kind, key, render):
+        cache_key = (kind, key)
+        with self._lock:
+            if cache_key in self._entries:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                record_cache('chart', True)
+                return self._entries[cache_key]
+            self.misses += 1
+        record_cache('chart', False)
+        rendered = render()
+        with self._lock:
+            self._entries[cache_key] = rendered
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rendered
+
+
+render_cache = RenderCache()
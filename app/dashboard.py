@@ -1,19 +1,15 @@
 import streamlit as st
-from app.movie_data import get_movie_data_from_rss_feed
 from datetime import datetime
 from streamlit_extras.stylable_container import stylable_container
-from app.visualisations import (
-    num_entries_kpi, num_hours_watched, bar_chart, get_top3_movies,
-    num_reviews_kpi, most_recent_log, first_log, num_new_movies_watched_kpi,
-    get_treemap_of_genres_movies_watched, english_foreign_language_pie_chart,
-)
 from st_social_media_links import SocialMediaIcons
-from app.poster_generator import create_poster
+from app.tracing import TRACING_ENABLED, metrics
 
+# The username form only needs streamlit. Loading, charts and the poster pull
+# in pandas, altair, matplotlib and PIL, so they're imported by the functions
+# that use them and the form is up before any of that has loaded.
+# app.warmup loads them in the background once the form has been sent.
 
-@st.cache_data
-def load_data(year, username):
-    return get_movie_data_from_rss_feed(f'https://letterboxd.com/{username}/rss/', year)
+PROGRESS_POLL_SECONDS = 0.25
 
 def render_disclaimer():
     st.markdown("""
@@ -23,14 +19,16 @@ def render_disclaimer():
     This project is for personal use only and is not affiliated with, endorsed, or sponsored by Letterboxd or TMDB.
     """)
 
-def generate_story(username, movie_df, current_year, top3):
+def generate_story(username, movie_df, current_year, top3, stats=None):
+    from app.poster_generator import create_poster
+    from app.poster_output import ENCODERS, POSTER_FORMAT
     with st.spinner("Generating Story..."):
-        poster_bytes = create_poster(username, movie_df, current_year, top3)
+        poster_bytes = create_poster(username, movie_df, current_year, top3, stats=stats)
         st.download_button(
             label="Download Story",
             data=poster_bytes,
-            file_name=f"{username}s_{current_year}_in_film.png",
-            mime="image/png",
+            file_name=f"{username}s_{current_year}_in_film.{ENCODERS[POSTER_FORMAT].extension}",
+            mime=ENCODERS[POSTER_FORMAT].mime,
             use_container_width=True
         )
         
@@ -59,6 +57,29 @@ def create_username_form(empty):
         submit_button2 = st.form_submit_button(label="View Dashboard (ONLY ON DESKTOP PLEASE 🥹)", use_container_width=True, on_click=lambda: setattr(st.session_state, 'clicked', True))
     return username, submit_button1, submit_button2
 
+def display_kpis(stats, enriched=True, previous=None):
+    from app.visualisations import (
+        num_entries_kpi, num_hours_watched, num_reviews_kpi, num_new_movies_watched_kpi, pending_kpi,
+    )
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        num_entries_kpi(stats, previous)
+    with col2:
+        num_new_movies_watched_kpi(stats, previous) if enriched else pending_kpi('NEW FILMS')
+    with col3:
+        num_hours_watched(stats, previous) if enriched else pending_kpi('HOURS')
+    with col4:
+        num_reviews_kpi(stats, previous)
+
+def select_year(years, default_year):
+    # years come from the one load, switching is just a slice of it
+    if default_year not in years:
+        default_year = years[0]
+    if st.session_state.get('dashboard_year') not in years:
+        st.session_state.dashboard_year = default_year
+    if len(years) == 1:
+        return years[0]
+    return st.radio("Year", years, horizontal=True, key="dashboard_year", label_visibility="collapsed")
 
 
 def display_top3_movies(top3):
@@ -91,47 +112,101 @@ def display_social_media_links():
     social_media_icons.render()
 
 
-def display_dashboard(username, movie_df, current_year, top3):
+def display_dashboard(username, movie_df, current_year, stats, previous_stats=None, summary_df=None):
+    from app.visualisations import (
+        bar_chart, get_treemap_of_genres_movies_watched, english_foreign_language_pie_chart, year_over_year_chart,
+    )
+    top3 = stats.top3
     col1, col2, col3 = st.columns([1, 7, 1])
     with col1:
-        first_movie = first_log(movie_df)
+        first_movie = stats.first_film
         st.image(first_movie[0]['image'], first_movie[0]['caption'], width=110)
     with col2:
         st.html(f"<h1 style='text-align: center; color: #e0edfd;'>{current_year}<br>{username}'s Year in Film</h1>")
         if st.button("Generate Story", use_container_width=True, key="generate_story_button_through_dashboard"):
-            generate_story(username, movie_df, current_year, top3)
+            generate_story(username, movie_df, current_year, top3, stats)
     with col3:
-        recent_movie = most_recent_log(movie_df)
+        recent_movie = stats.last_film
         print(recent_movie)
         st.image(recent_movie[0]['image'], recent_movie[0]['caption'], width=110)
 
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        num_entries_kpi(movie_df)
-    with col2:
-        num_new_movies_watched_kpi(movie_df, current_year)
-    with col3:
-        num_hours_watched(movie_df)
-    with col4:
-        num_reviews_kpi(movie_df)
+    display_kpis(stats, previous=previous_stats)
 
     col1, col2, col3 = st.columns([1, 1, 2])
     with col1:
-        get_treemap_of_genres_movies_watched(movie_df)
+        get_treemap_of_genres_movies_watched(stats)
     with col2:
         container = st.container(border=False, height=352)
         with container:
-            english_foreign_language_pie_chart(movie_df)
-            bar_chart(movie_df)
+            english_foreign_language_pie_chart(stats)
+            bar_chart(stats)
     with col3:
         display_top3_movies(top3)
 
+    if summary_df is not None and len(summary_df) > 1:
+        year_over_year_chart(summary_df, current_year)
     
 
     
     # display_social_media_links()
 
-    
+def display_partial_dashboard(username, current_year, feed_stats):
+    from app.visualisations import bar_chart
+    # what the RSS feed alone can show while TMDB enrichment is still running
+    st.html(f"<h1 style='text-align: center; color: #e0edfd;'>{current_year}<br>{username}'s Year in Film</h1>")
+    if feed_stats is None:
+        st.caption("Reading your diary...")
+        return
+    display_kpis(feed_stats, enriched=False)
+    col1, col2 = st.columns([2, 2])
+    with col1:
+        bar_chart(feed_stats)
+    with col2:
+        st.caption("Fetching film details...")
+
+def display_dashboard_progressively(username, current_year, job):
+    # the load runs on the prefetch executor; keep redrawing the partial view
+    # until it finishes, then swap in the full dashboard
+    from app.stats import yearly_summary
+    placeholder = st.empty()
+    shown = ()
+    while not job.done.is_set():
+        feed_df = job.feed_df
+        if feed_df is not shown and not job.done.is_set():
+            with placeholder.container():
+                display_partial_dashboard(username, current_year, job.feed_stats(current_year))
+            if feed_df is not None:
+                job.record_render('first_kpi')
+            shown = feed_df
+        job.done.wait(PROGRESS_POLL_SECONDS)
+    job.wait()
+    with placeholder.container():
+        if not job.years:
+            st.html(f"<h3 style='text-align: center; color: #e0edfd;'>No diary entries found for {username}</h3>")
+            return
+        years = list(job.years)
+        year = select_year(years, current_year)
+        stats_by_year = {y: job.year_stats(y) for y in years}
+        display_dashboard(username, job.year_frame(year), year, stats_by_year[year],
+                          previous_stats=stats_by_year.get(year - 1), summary_df=yearly_summary(stats_by_year.values()))
+    job.record_render('first_kpi')
+    job.record_render('complete')
+
+def load_diary(username, year):
+    # starts the background load (or finds the one already running)
+    from app.prefetch import start_prefetch
+    return start_prefetch(username, year)
+
+def display_debug_panel():
+    # only with LETTERBOXDBI_TRACING=1 and ?debug=1 in the URL
+    from app.frame_cache import frame_cache
+    with st.expander("Debug: timings"):
+        st.dataframe(metrics.stage_rows(), use_container_width=True)
+        st.dataframe(metrics.cache_rows(), use_container_width=True)
+        st.json(frame_cache.stats())
+        prometheus_text = metrics.prometheus_text()
+        st.download_button("Download metrics", prometheus_text, file_name="letterboxdbi.prom", mime="text/plain")
+        st.code(prometheus_text, language=None)
 
 def main():
     # set_page_style()
@@ -146,22 +221,29 @@ def main():
     # with disclaimer_container:
     #     render_disclaimer()
 
-    if submit_button1:
-        current_year = datetime.now().year
-        movie_df = load_data(current_year, username)
-        top3 = get_top3_movies(movie_df)
-        generate_story(username, movie_df, current_year, top3)
-
-    if st.session_state.clicked:
+    current_year = datetime.now().year
+    if (submit_button1 or submit_button2) and username:
+        # start fetching straight away; the form clears on submit, so keep the name for later reruns
+        st.session_state.username = username
+        load_diary(username, current_year)
+    username = st.session_state.get('username')
+
+    if submit_button1 and username:
+        job = load_diary(username, current_year)
+        with st.spinner("Loading your diary..."):
+            job.wait()
+        stats = job.year_stats(current_year)
+        generate_story(username, job.year_frame(current_year), current_year, stats.top3, stats)
+
+    if st.session_state.clicked and username:
         text_input_container.empty()
         # disclaimer_container.empty()
-        current_year = datetime.now().year
-        movie_df = load_data(current_year, username)
-        
-        top3 = get_top3_movies(movie_df)
-        display_dashboard(username, movie_df, current_year, top3)
+        display_dashboard_progressively(username, current_year, load_diary(username, current_year))
 
     display_social_media_links()
 
+    if TRACING_ENABLED and st.query_params.get('debug') == '1':
+        display_debug_panel()
+
 # if __name__ == "__main__":
 #     main()
\ No newline at end of file
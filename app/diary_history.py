@@ -0,0 +1,160 @@
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app.files import atomic_write
+from app.movie_data import (
+    TMDB_MAX_WORKERS, build_letterboxd_frame, fetch_tmdb_frame, merge_tmdb_data, search_tmdb_movie_id, tmdb_keys,
+)
+from app.schema import build_movie_frame
+from app.tmdb_cache import CACHE_DIR
+
+# Full diary history from a Letterboxd data export (diary.csv, plus reviews.csv
+# for review text), for users whose year doesn't fit in the RSS window.
+# The CSV is read in chunks, only rows from the requested year are enriched,
+# and each enriched chunk is written to a checkpoint so an interrupted import
+# resumes where it stopped. Memory is bounded by the chunk size and the size
+# of one year, not by the length of the diary.
+HISTORY_DIR = os.path.join(CACHE_DIR, 'history')
+CHUNK_ROWS = 1000
+
+
+def watched_dates(chunk):
+    dates = chunk['Watched Date'].where(chunk['Watched Date'] != '', chunk['Date'])
+    return pd.to_datetime(dates, format='ISO8601', utc=True)
+
+
+def load_reviews(path, year):
+    # reviews keyed by Letterboxd URI, only for the requested year
+    if not path:
+        return {}
+    reviews = {}
+    for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS, dtype=str, keep_default_na=False):
+        chunk = chunk[watched_dates(chunk).dt.year == year]
+        reviews.update(zip(chunk['Letterboxd URI'], chunk['Review']))
+    return reviews
+
+
+def resolve_tmdb_ids(chunk, max_workers=TMDB_MAX_WORKERS):
+    keys = list(dict.fromkeys(zip(chunk['Name'], chunk['Year'])))
+    if not keys:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(keys))) as executor:
+        ids = dict(zip(keys, executor.map(lambda key: search_tmdb_movie_id(*key), keys)))
+    return [ids[key] for key in zip(chunk['Name'], chunk['Year'])]
+
+
+def diary_chunk_to_letterboxd_data(chunk, dates, reviews):
+    tmdb_ids = resolve_tmdb_ids(chunk)
+    return [
+        {
+            'guid': uri,
+            'title': name,
+            'logDate': date.strftime('%Y-%m-%d'),
+            'memberRating': rating or None,
+            'rewatch': rewatch == 'Yes',
+            'tmdb_id': tmdb_id,
+            'media_type': 'movie' if tmdb_id else None,
+            # same convention as the RSS feed: unreviewed entries read "Watched on ..."
+            'description': reviews.get(uri) or f'Watched on {date:%A %B} {date.day}, {date.year}.',
+        }
+        for uri, name, rating, rewatch, date, tmdb_id in zip(
+            chunk['Letterboxd URI'], chunk['Name'], chunk['Rating'], chunk['Rewatch'], dates, tmdb_ids
+        )
+    ]
+
+
+def source_key(path):
+    # a re-export of the same diary can keep its size, so the modification time
+    # is part of the key too
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class HistoryImport:
+    def __init__(self, username, year, directory=HISTORY_DIR):
+        self.directory = os.path.join(directory, f'{username}_{year}')
+        self.state_path = os.path.join(self.directory, 'state.json')
+        self.year = year
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load_state(self, source, reviews=None):
+        sources = {'diary': source_key(source), 'reviews': source_key(reviews) if reviews else None}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state.get('sources') == sources:
+                return state
+        # new or changed export: start over
+        for part in glob.glob(os.path.join(self.directory, 'part-*.parquet')):
+            os.remove(part)
+        return {'sources': sources, 'rows_done': 0, 'parts': 0, 'finished': False}
+
+    def save_state(self, state):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+        atomic_write(self.state_path, write)
+
+    def part_path(self, index):
+        return os.path.join(self.directory, f'part-{index:05d}.parquet')
+
+    def run(self, diary_csv, reviews_csv=None, chunk_rows=CHUNK_ROWS):
+        state = self.load_state(diary_csv, reviews_csv)
+        if not state['finished']:
+            reviews = load_reviews(reviews_csv, self.year)
+            chunks = pd.read_csv(
+                diary_csv, chunksize=chunk_rows, dtype=str, keep_default_na=False,
+                skiprows=range(1, state['rows_done'] + 1),
+            )
+            for chunk in chunks:
+                dates = watched_dates(chunk)
+                # rows are picked by watched date but the export is sorted by the
+                # date they were logged, so every chunk has to be read
+                in_year = (dates.dt.year == self.year).to_numpy()
+                if in_year.any():
+                    letterboxd_data = diary_chunk_to_letterboxd_data(chunk[in_year], dates[in_year], reviews)
+                    letterboxd_df = build_letterboxd_frame(letterboxd_data).dropna(subset=['tmdb_id'])
+                    tmdb_df = fetch_tmdb_frame(tmdb_keys(letterboxd_df))
+                    merge_tmdb_data(letterboxd_df, tmdb_df).to_parquet(self.part_path(state['parts']), index=False)
+                    state['parts'] += 1
+                state['rows_done'] += len(chunk)
+                self.save_state(state)
+            state['finished'] = True
+            self.save_state(state)
+        return self.load_frame(state)
+
+    def load_frame(self, state):
+        parts = [pd.read_parquet(self.part_path(i)) for i in range(state['parts'])]
+        if not parts:
+            return build_movie_frame(merge_tmdb_data(build_letterboxd_frame([]), fetch_tmdb_frame([])))
+        merged_df = pd.concat(parts, ignore_index=True).sort_values('logDate', ascending=False)
+        return build_movie_frame(merged_df)
+
+
+def import_diary_history(username, year, diary_csv, reviews_csv=None, chunk_rows=CHUNK_ROWS):
+    return HistoryImport(username, year).run(diary_csv, reviews_csv, chunk_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import a full year from a Letterboxd diary.csv export')
+    parser.add_argument('diary_csv')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--reviews-csv', help='reviews.csv from the same export')
+    parser.add_argument('--output', help='write the typed frame to this Parquet file')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    movie_df = import_diary_history(args.username, args.year, args.diary_csv, args.reviews_csv, args.chunk_rows)
+    print(f'{len(movie_df)} entries for {args.username} in {args.year}')
+    if args.output:
+        movie_df.to_parquet(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
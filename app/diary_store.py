@@ -0,0 +1,180 @@
+import json
+import os
+import re
+
+import pandas as pd
+
+from app import http_client
+from app.files import atomic_write
+from app.movie_data import (
+    LETTERBOXD_COLUMNS, TMDB_COLUMNS, build_letterboxd_frame, fetch_tmdb_frame, merge_tmdb_data,
+    iter_rss_items, rss_feed_url, tmdb_keys,
+)
+from app.schema import build_movie_frame
+from app.tmdb_cache import CACHE_DIR
+from app.tracing import span
+
+# Per-user copy of everything seen in the RSS feed so far, plus the validators
+# needed to make the next refresh a conditional request. Each entry's
+# fingerprint (see movie_data.item_fingerprint) and publish time are kept, so a
+# refresh only parses and enriches entries that are new or were edited, and
+# drops stored entries that were deleted: those missing from the feed but
+# published after its oldest item.
+DIARY_DIR = os.path.join(CACHE_DIR, 'diaries')
+
+
+class DiaryStore:
+    def __init__(self, username, directory=DIARY_DIR):
+        self.username = username
+        safe_name = re.sub(r'[^A-Za-z0-9_-]', '_', username)
+        self.state_path = os.path.join(directory, f'{safe_name}.json')
+        self.frame_path = os.path.join(directory, f'{safe_name}.parquet')
+        os.makedirs(directory, exist_ok=True)
+
+    def load_state(self):
+        if not os.path.exists(self.state_path) or not os.path.exists(self.frame_path):
+            return {'etag': None, 'last_modified': None, 'entries': {}}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        atomic_write(self.state_path, lambda path: _write_json(path, state))
+
+    def load_frame(self):
+        if not os.path.exists(self.frame_path):
+            return None
+        df = pd.read_parquet(self.frame_path)
+        # parquet hands list columns back as arrays
+        df['genres'] = df['genres'].map(list)
+        if 'media_type' not in df.columns:
+            # stored before TV entries were told apart, everything was looked up as a movie
+            df.insert(df.columns.get_loc('tmdb_id') + 1, 'media_type', 'movie')
+        if 'rewatch' not in df.columns:
+            df.insert(df.columns.get_loc('memberRating') + 1, 'rewatch', False)
+        return df
+
+    def save_frame(self, df):
+        atomic_write(self.frame_path, lambda path: df.to_parquet(path, index=False))
+
+
+def _write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def conditional_headers(state):
+    headers = {}
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    if state.get('last_modified'):
+        headers['If-Modified-Since'] = state['last_modified']
+    return headers
+
+
+def deleted_guids(stored_entries, feed_entries):
+    # the feed holds the most recently published entries; a stored entry
+    # published within that window that isn't in it anymore was deleted
+    if not feed_entries:
+        return set(stored_entries)
+    published = [published for _, published in feed_entries.values() if published is not None]
+    if not published:
+        return set()
+    window_start = min(published)
+    return {
+        guid for guid, (_, published) in stored_entries.items()
+        if guid not in feed_entries and published is not None and published >= window_start
+    }
+
+
+def enrich_new_entries(letterboxd_df, stored_df):
+    # reuse TMDB columns already in the store, only fetch ids we haven't seen
+    wanted_keys = tmdb_keys(letterboxd_df)
+    if stored_df is not None and not stored_df.empty:
+        known_tmdb_df = stored_df[TMDB_COLUMNS].drop_duplicates(['id', 'media_type'])
+        known_keys = pd.MultiIndex.from_frame(known_tmdb_df[['id', 'media_type']])
+        known_tmdb_df = known_tmdb_df[known_keys.isin(wanted_keys)]
+    else:
+        known_tmdb_df = pd.DataFrame(columns=TMDB_COLUMNS)
+    known_keys = set(zip(known_tmdb_df['id'], known_tmdb_df['media_type']))
+    tmdb_df = fetch_tmdb_frame([key for key in wanted_keys if key not in known_keys])
+    if not known_tmdb_df.empty:
+        tmdb_df = pd.concat([known_tmdb_df, tmdb_df], ignore_index=True) if not tmdb_df.empty else known_tmdb_df
+    return merge_tmdb_data(letterboxd_df, tmdb_df)
+
+
+def sync_diary(username, url=None, on_feed=None):
+    # on_feed, if given, is called with the diary's Letterboxd columns as soon
+    # as the feed is parsed, before any TMDB enrichment
+    store = DiaryStore(username)
+    state = store.load_state()
+    stored_df = store.load_frame()
+
+    # stored before fingerprints were kept: every item is parsed once more
+    stored_entries = {guid: tuple(entry) for guid, entry in state.get('entries', {}).items()}
+    with span('rss.fetch'):
+        response = http_client.get(url or rss_feed_url(username), headers=conditional_headers(state), stream=True)
+    with response:
+        if response.status_code == 304 and stored_df is not None:
+            if on_feed:
+                on_feed(stored_df[LETTERBOXD_COLUMNS])
+            return stored_df
+        response.raise_for_status()
+        response.raw.decode_content = True
+        feed_entries = {}
+        known = {guid: fingerprint for guid, (fingerprint, _) in stored_entries.items()}
+        # new and edited entries only
+        new_items = list(iter_rss_items(response.raw, known=known, seen=feed_entries))
+
+    deleted = deleted_guids(stored_entries, feed_entries)
+    if stored_df is not None and deleted:
+        stored_df = stored_df[~stored_df['guid'].isin(deleted)]
+
+    letterboxd_df = build_letterboxd_frame(new_items)
+    if on_feed:
+        if stored_df is not None and not stored_df.empty:
+            known_df = stored_df.loc[~stored_df['guid'].isin(letterboxd_df['guid']), LETTERBOXD_COLUMNS]
+            on_feed(pd.concat([letterboxd_df, known_df], ignore_index=True) if not letterboxd_df.empty else known_df)
+        else:
+            on_feed(letterboxd_df)
+
+    entries = {guid: entry for guid, entry in stored_entries.items() if guid not in deleted}
+    entries.update(feed_entries)
+    retry = False
+    if new_items or stored_df is None:
+        new_df = enrich_new_entries(letterboxd_df, stored_df)
+        if stored_df is not None and not stored_df.empty:
+            stored_df = stored_df[~stored_df['guid'].isin(new_df['guid'])]
+            stored_df = pd.concat([new_df, stored_df], ignore_index=True) if not new_df.empty else stored_df
+        else:
+            stored_df = new_df
+        # entries whose TMDB lookup failed keep no fingerprint so the next sync retries just those
+        failed = letterboxd_df['tmdb_id'].notna() & ~letterboxd_df['guid'].isin(new_df['guid'])
+        for guid in letterboxd_df.loc[failed, 'guid'].dropna():
+            entries[guid] = (None, entries.get(guid, (None, None))[1])
+        retry = failed.any()
+    if new_items or deleted or not os.path.exists(store.frame_path):
+        store.save_frame(stored_df)
+
+    store.save_state({
+        # without validators the next sync can't get a 304 and skip the retries
+        'etag': None if retry else response.headers.get('ETag'),
+        'last_modified': None if retry else response.headers.get('Last-Modified'),
+        'entries': entries,
+    })
+    return stored_df
+
+
+def load_user_diary(username, url=None, on_feed=None):
+    # every year in the store, typed; slice it by year rather than loading each year again
+    return build_movie_frame(sync_diary(username, url, on_feed=on_feed))
+
+
+def load_user_year(username, year, url=None, on_feed=None):
+    if on_feed and year:
+        feed_callback = lambda feed_df: on_feed(feed_df[feed_df['logDate'].dt.year == year])
+    else:
+        feed_callback = on_feed
+    diary_df = sync_diary(username, url, on_feed=feed_callback)
+    if year:
+        diary_df = diary_df[diary_df['logDate'].dt.year == year]
+    return build_movie_frame(diary_df)
@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+
+# Shared helpers for the on-disk caches. Files are written to a temp name and
+# renamed into place, so readers in any thread or process never see a partial
+# file; directories are pruned oldest first once they grow past a size bound.
+
+
+def temp_path(path):
+    # unique per process and thread, two writers of the same file never share one
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def atomic_write(path, write):
+    # write(tmp_path) fills the temp file, which then replaces path in one step
+    tmp_path = temp_path(path)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_bytes(path, data):
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    atomic_write(path, write)
+
+
+def prune_directory(directory, max_bytes, ttl=0):
+    # removes the least recently written files until the directory fits in
+    # max_bytes, along with anything older than ttl seconds when ttl is set;
+    # temp files belong to writes still in progress and are left alone
+    now = time.time()
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for mtime, size, path in sorted(files):
+        if total <= max_bytes and not (ttl > 0 and now - mtime > ttl):
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+class WriteCounter:
+    # due() is True on every nth call, for upkeep that only needs to run every few writes
+    def __init__(self, every):
+        self.every = every
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def due(self):
+        with self._lock:
+            self.count += 1
+            return self.count % self.every == 0
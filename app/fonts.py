@@ -0,0 +1,109 @@
+import functools
+import logging
+import os
+import time
+
+import requests
+from PIL import ImageFont
+
+from app import http_client
+from app.files import write_bytes
+from app.tmdb_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Fonts are read from the vendored static/fonts directory first, then from the
+# local cache. A missing file is downloaded once into the cache unless
+# FONT_DOWNLOAD=0. Loading by path lets FreeType memory-map the file instead
+# of every process holding its own copy of the bytes. A font that can't be
+# found or downloaded is drawn with Pillow's built-in font, so stories still
+# render offline; the download is tried again after FONT_RETRY_AFTER seconds.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FONT_DIR = os.getenv('LETTERBOXDBI_FONT_DIR', os.path.join(BASE_DIR, 'static', 'fonts'))
+FONT_CACHE_DIR = os.path.join(CACHE_DIR, 'fonts')
+FONT_DOWNLOAD = os.getenv('FONT_DOWNLOAD', '1') != '0'
+FONT_RETRY_AFTER = float(os.getenv('FONT_RETRY_AFTER', 300))
+
+FONT_URLS = {
+    'NotoEmoji.ttf': 'https://github.com/google/fonts/blob/main/ofl/notoemoji/NotoEmoji%5Bwght%5D.ttf?raw=true',
+    'LibreBaskerville-Bold.ttf': 'https://github.com/google/fonts/blob/main/ofl/librebaskerville/LibreBaskerville-Bold.ttf?raw=true',
+    'Roboto-Black.ttf': 'https://github.com/openmaptiles/fonts/blob/master/roboto/Roboto-Black.ttf?raw=true',
+    'Roboto-Bold.ttf': 'https://github.com/openmaptiles/fonts/blob/master/roboto/Roboto-Bold.ttf?raw=true',
+}
+
+FONT_SIZES = {
+    'emoji_font': ('NotoEmoji.ttf', 30),
+    'font_highlights': ('LibreBaskerville-Bold.ttf', 50),
+    'font_numbers': ('LibreBaskerville-Bold.ttf', 70),
+    'font_numbers_medium': ('LibreBaskerville-Bold.ttf', 40),
+    'font_small': ('Roboto-Bold.ttf', 40),
+    'font_text': ('Roboto-Bold.ttf', 30),
+    'font_large': ('Roboto-Black.ttf', 70),
+}
+
+
+def download_font(filename, directory=FONT_CACHE_DIR):
+    response = http_client.get(FONT_URLS[filename])
+    response.raise_for_status()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    write_bytes(path, response.content)
+    return path
+
+
+# filename -> when its download last failed
+_download_failed = {}
+_fonts = None
+
+
+@functools.lru_cache
+def font_path(filename, download=FONT_DOWNLOAD):
+    # only found paths are cached, a miss raises and is looked for again next time
+    for directory in (FONT_DIR, FONT_CACHE_DIR):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    failed = _download_failed.get(filename)
+    if not download or (failed is not None and time.monotonic() - failed < FONT_RETRY_AFTER):
+        raise FileNotFoundError(f'{filename} not found in {FONT_DIR} or {FONT_CACHE_DIR}')
+    try:
+        return download_font(filename)
+    except (OSError, requests.RequestException) as e:
+        _download_failed[filename] = time.monotonic()
+        logger.warning('Could not download %s, drawing with the default font: %s', filename, e)
+        raise
+
+
+def load_fonts():
+    global _fonts
+    if _fonts is not None:
+        return _fonts
+    fonts = {}
+    complete = True
+    for key, (filename, size) in FONT_SIZES.items():
+        try:
+            fonts[key] = ImageFont.truetype(font_path(filename), size)
+        except (OSError, requests.RequestException):
+            fonts[key] = ImageFont.load_default(size)
+            complete = False
+    # a set with stand-ins is rebuilt next time, in case the files have turned up
+    if complete:
+        _fonts = fonts
+    return fonts
+
+
+def all_fonts_loaded():
+    return _fonts is not None
+
+
+def preload_fonts():
+    # called at startup, so the first story doesn't wait on loading or downloading them
+    load_fonts()
+
+
+if __name__ == '__main__':
+    # vendor every font into static/fonts
+    for filename in FONT_URLS:
+        if not os.path.exists(os.path.join(FONT_DIR, filename)):
+            print(f'Downloading {filename}')
+            download_font(filename, FONT_DIR)
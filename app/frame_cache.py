@@ -0,0 +1,159 @@
+import hashlib
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import pandas as pd
+
+from app.files import atomic_write, prune_directory
+from app.schema import MOVIE_DTYPES
+from app.tmdb_cache import CACHE_DIR
+from app.tracing import record_cache
+
+# Enriched diary frames, held in memory up to FRAME_CACHE_MAX_BYTES. The least
+# recently used frames are spilled to zstd-compressed Parquet under
+# <cache dir>/frames and read back from there on the next visit. Entries
+# expire FRAME_CACHE_TTL seconds after they were stored, in either tier.
+# Spill files are named after the key, so worker processes can read each
+# other's spills, and they're pruned once the directory passes
+# FRAME_SPILL_MAX_BYTES.
+FRAME_DIR = os.path.join(CACHE_DIR, 'frames')
+FRAME_CACHE_MAX_BYTES = int(os.getenv('FRAME_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+FRAME_SPILL_MAX_BYTES = int(os.getenv('FRAME_SPILL_MAX_BYTES', 1024 * 1024 * 1024))
+FRAME_CACHE_TTL = float(os.getenv('FRAME_CACHE_TTL', 3600))
+
+# only prune the spill directory every few spills, it needs a walk of the directory
+PRUNE_EVERY = 50
+
+
+def frame_bytes(df):
+    # deep, so string columns count their contents and not just the pointers
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def read_spill(path):
+    df = pd.read_parquet(path)
+    # parquet keeps the categories but reads strings back as python strings
+    return df.astype({column: dtype for column, dtype in MOVIE_DTYPES.items() if column in df.columns})
+
+
+class FrameCache:
+    def __init__(self, directory=FRAME_DIR, max_bytes=FRAME_CACHE_MAX_BYTES, ttl=FRAME_CACHE_TTL,
+                 max_spill_bytes=FRAME_SPILL_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_spill_bytes = max_spill_bytes
+        # key -> (frame, size in bytes, time stored)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.counts = Counter()
+
+    def spill_path(self, key):
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, name[:2], f'{name}.parquet')
+
+    def _expired(self, stored, now):
+        return self.ttl > 0 and now - stored > self.ttl
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[2], now):
+                self._drop(key)
+                self.counts['expired'] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counts['memory_hits'] += 1
+                record_cache('frame_memory', True)
+                return entry[0]
+        record_cache('frame_memory', False)
+
+        df, stored = self._read_spill(key, now)
+        record_cache('frame_disk', df is not None)
+        if df is None:
+            self._count('misses')
+            return None
+        self._count('disk_hits')
+        # back into memory, keeping the original time stored so it still expires on schedule
+        self._insert(key, df, stored)
+        return df
+
+    def put(self, key, df):
+        self._remove_spill(key)
+        self._insert(key, df, time.time())
+
+    def _insert(self, key, df, stored):
+        size = frame_bytes(df)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (df, size, stored)
+            self.bytes += size
+            evicted = []
+            # the newest frame always stays, even on its own over the limit
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, (evicted_df, evicted_size, evicted_stored) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                evicted.append((evicted_key, evicted_df, evicted_stored))
+            self.counts['evictions'] += len(evicted)
+        for evicted_key, evicted_df, evicted_stored in evicted:
+            self._spill(evicted_key, evicted_df, evicted_stored)
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _drop(self, key):
+        # caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def _spill(self, key, df, stored):
+        if self._expired(stored, time.time()):
+            return
+        path = self.spill_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        def write(tmp_path):
+            df.to_parquet(tmp_path, index=False, compression='zstd')
+            # the file's mtime carries the time stored, for expiry after it's read back
+            os.utime(tmp_path, (stored, stored))
+        atomic_write(path, write)
+        self._count('spills')
+        if self.counts['spills'] % PRUNE_EVERY == 0:
+            self.prune_spills()
+
+    def _read_spill(self, key, now):
+        path = self.spill_path(key)
+        try:
+            stored = os.stat(path).st_mtime
+            if self._expired(stored, now):
+                os.remove(path)
+                self._count('expired')
+                return None, None
+            df = read_spill(path)
+        except FileNotFoundError:
+            return None, None
+        # the frame lives in memory again, a later eviction writes it back out
+        self._remove_spill(key)
+        return df, stored
+
+    def _remove_spill(self, key):
+        try:
+            os.remove(self.spill_path(key))
+        except FileNotFoundError:
+            pass
+
+    def prune_spills(self):
+        prune_directory(self.directory, self.max_spill_bytes, self.ttl)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.bytes, **self.counts}
+
+
+frame_cache = FrameCache()
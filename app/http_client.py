@@ -0,0 +1,158 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.tracing import TRACING_ENABLED, record_http
+
+# Shared connection pool and per-host limits for every outbound request
+POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 16))
+MAX_CONCURRENCY_PER_HOST = int(os.getenv('HTTP_MAX_CONCURRENCY_PER_HOST', 8))
+REQUEST_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 15))
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+MAX_BACKOFF = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_session = None
+_host_semaphores = {}
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def _host_semaphore(url):
+    host = urlsplit(url).netloc
+    with _lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(MAX_CONCURRENCY_PER_HOST)
+        return _host_semaphores[host]
+
+
+def retry_after_seconds(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    return min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class TokenBucket:
+    # process-wide request budget: rate requests per second, bursts up to capacity
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def hold(self, seconds):
+        # upstream asked us to back off: stop every caller, not just the one that got the 429
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # concurrent calls with the same key share one execution of func
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def get(url, max_retries=MAX_RETRIES, limiter=None, **kwargs):
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    session = get_session()
+    semaphore = _host_semaphore(url)
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        with semaphore:
+            response = session.get(url, **kwargs)
+        if TRACING_ENABLED:
+            # streamed bodies aren't read yet, count what the server says it sent
+            size = int(response.headers.get('Content-Length') or 0) if kwargs.get('stream') else len(response.content)
+            record_http(urlsplit(url).netloc, response.status_code, size)
+        if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+            return response
+        delay = retry_after_seconds(response)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        elif limiter is not None:
+            limiter.hold(min(delay, MAX_BACKOFF))
+        response.close()
+        # sleep outside the semaphore so waiting requests don't hold a host slot
+        time.sleep(min(delay, MAX_BACKOFF))
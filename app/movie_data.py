@@ -1,20 +1,48 @@
 import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
 import pandas as pd
-import requests
+import hashlib
+import html
 import os
-from dotenv import load_dotenv
+import re
+import logging
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from app import http_client
+from app.tmdb_cache import get_cache
+from app.tmdb_index import get_index
+from app.tracing import record_cache, traced
+from app.schema import build_movie_frame
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 NAMESPACES = {
     'tmdb': 'https://themoviedb.org',
     'letterboxd': 'https://letterboxd.com'
 }
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
+LETTERBOXD_URL = os.getenv('LETTERBOXD_URL', 'https://letterboxd.com')
+TMDB_API_URL = os.getenv('TMDB_API_URL', 'https://api.themoviedb.org/3')
+TMDB_IMAGE_URL = os.getenv('TMDB_IMAGE_URL', 'https://image.tmdb.org/t/p')
+TMDB_MAX_WORKERS = int(os.getenv('TMDB_MAX_WORKERS', 8))
+# requests per second to the TMDB API across the whole process, 0 to turn off
+TMDB_RATE_LIMIT = float(os.getenv('TMDB_RATE_LIMIT', 40))
+TMDB_RATE_BURST = float(os.getenv('TMDB_RATE_BURST', 20))
 
+tmdb_limiter = http_client.TokenBucket(TMDB_RATE_LIMIT, TMDB_RATE_BURST) if TMDB_RATE_LIMIT > 0 else None
+# sessions asking for the same film at the same time share one request
+tmdb_requests = http_client.SingleFlight()
+
+LETTERBOXD_COLUMNS = ['guid', 'title', 'logDate', 'memberRating', 'rewatch', 'tmdb_id', 'media_type', 'description']
+TMDB_COLUMNS = ['id', 'media_type', 'original_title', 'runtime', 'genres', 'release_date', 'original_language', 'poster_url']
+# movie and TV ids overlap, so entries are matched to TMDB data on both
+TMDB_KEY = ['tmdb_id', 'media_type']
+
+def rss_feed_url(username):
+    return f'{LETTERBOXD_URL}/{username}/rss/'
+
+@traced('rss.fetch')
 def fetch_rss_feed(url):
-    response = requests.get(url)
+    response = http_client.get(url)
     response.raise_for_status()
     return ET.fromstring(response.text)
 
@@ -29,31 +57,105 @@ def fetch_rss_feed(url):
 #     'description': description
 #     } 
 
-def parse_movie_data(item):
+ITEM_TAG = 'item'
+CHANNEL_TAG = 'channel'
+_P_OPEN = re.compile(r'<p[\s>]', re.IGNORECASE)
+_P_CLOSE = re.compile(r'</p\s*>', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]*>')
+
+def soup_review_text(description_html):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(description_html, 'html.parser').find_all('p')[1].get_text()
+
+def extract_review_text(description_html):
+    # same text as soup_review_text without building a tree: the first <p>
+    # holds the poster image, the review (or "Watched on ...") is in the second
+    paragraphs = _P_OPEN.finditer(description_html)
+    next(paragraphs, None)
+    second = next(paragraphs, None)
+    if second is None:
+        return ''
+    end = _P_CLOSE.search(description_html, second.end())
+    fragment = description_html[second.start():end.start() if end else len(description_html)]
+    return html.unescape(_TAG.sub('', fragment))
+
+def item_fingerprint(item):
+    # changes whenever the entry is edited: watched date, rating, rewatch or review
+    fields = [item.findtext(f'letterboxd:{name}', '', NAMESPACES) for name in ('watchedDate', 'memberRating', 'rewatch')]
+    fields.append(item.findtext('description', ''))
+    return hashlib.sha1('\x1f'.join(fields).encode()).hexdigest()[:16]
+
+def item_published(item):
+    # pubDate as a timestamp, None if it's missing or unreadable
+    try:
+        return parsedate_to_datetime(item.findtext('pubDate')).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def iter_rss_items(source, known=None, seen=None, extract_review=extract_review_text):
+    # yields parsed items while the feed is still being read, dropping each
+    # element once it's been parsed so memory doesn't grow with the feed.
+    # known maps guid -> fingerprint; items whose fingerprint still matches
+    # are skipped. seen, if given, collects guid -> (fingerprint, published)
+    # for every item in the feed, skipped or not.
+    channel = None
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == CHANNEL_TAG:
+                channel = element
+            continue
+        if element.tag != ITEM_TAG:
+            continue
+        if known is None and seen is None:
+            yield parse_movie_data(element, extract_review)
+        else:
+            guid = element.findtext('guid')
+            fingerprint = item_fingerprint(element)
+            if seen is not None:
+                seen[guid] = (fingerprint, item_published(element))
+            if known is None or known.get(guid) != fingerprint:
+                yield parse_movie_data(element, extract_review)
+        if channel is not None:
+            channel.remove(element)
+
+def stream_rss_feed(url, known=None, **kwargs):
+    response = http_client.get(url, stream=True, **kwargs)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    with response:
+        yield from iter_rss_items(response.raw, known)
+
+@traced('rss.parse_item')
+def parse_movie_data(item, extract_review=soup_review_text):
+    guid = item.findtext('guid')
     title = item.find('letterboxd:filmTitle', NAMESPACES)
     title = title.text if title is not None else None
     description = item.find('description')
-    description = BeautifulSoup(description.text, 'html.parser').find_all('p')[1].get_text() if description is not None else None
+    description = extract_review(description.text) if description is not None else None
     log_date = item.find('letterboxd:watchedDate', NAMESPACES)
     log_date = log_date.text if log_date is not None else None
     member_rating = item.find('letterboxd:memberRating', NAMESPACES)
     member_rating = member_rating.text if member_rating is not None else None
+    rewatch = item.findtext('letterboxd:rewatch', namespaces=NAMESPACES) == 'Yes'
     tmdb_id = item.find('tmdb:movieId', NAMESPACES)
     tmdb_id = tmdb_id.text if tmdb_id is not None else None
+    media_type = 'movie' if tmdb_id is not None else None
     if tmdb_id is None:
         tmdb_id = item.find('tmdb:tvId', NAMESPACES)
         tmdb_id = tmdb_id.text if tmdb_id is not None else None
+        media_type = 'tv' if tmdb_id is not None else None
     return {
+        'guid': guid,
         'title': title,
         'logDate': log_date,
         'memberRating': member_rating,
+        'rewatch': rewatch,
         'tmdb_id': tmdb_id,
+        'media_type': media_type,
         'description': description
     }
 
-def fetch_tmdb_movie_data(tmdb_id):
-    tmdb_url = f'https://api.themoviedb.org/3/movie/{tmdb_id}?api_key={TMDB_API_KEY}'
-    tmdb_movie_response = requests.get(tmdb_url).json()
+def movie_record(tmdb_id, tmdb_movie_response):
     return {
         'id': tmdb_id,
         'original_title': tmdb_movie_response['original_title'],
@@ -61,32 +163,157 @@ def fetch_tmdb_movie_data(tmdb_id):
         'genres': [v['name'] for v in tmdb_movie_response['genres']],
         'release_date': tmdb_movie_response['release_date'],
         'original_language': tmdb_movie_response['original_language'],
-        'poster_url': f"https://image.tmdb.org/t/p/w1280{tmdb_movie_response['poster_path']}"
+        'poster_url': f"{TMDB_IMAGE_URL}/w1280{tmdb_movie_response['poster_path']}"
     }
 
-def get_movie_data_from_rss_feed(url, year=None):
-    root = fetch_rss_feed(url)
-    letterboxd_data = [parse_movie_data(item) for item in root.findall('.//item')]
-    
-    letterboxd_df = pd.DataFrame(letterboxd_data)
+def tv_record(tmdb_id, tmdb_tv_response):
+    # /3/tv/{id} names things differently; runtime is a typical episode's length
+    episode_runtimes = tmdb_tv_response.get('episode_run_time') or []
+    last_episode = tmdb_tv_response.get('last_episode_to_air') or {}
+    return {
+        'id': tmdb_id,
+        'original_title': tmdb_tv_response['original_name'],
+        'runtime': episode_runtimes[0] if episode_runtimes else last_episode.get('runtime'),
+        'genres': [v['name'] for v in tmdb_tv_response['genres']],
+        'release_date': tmdb_tv_response.get('first_air_date') or None,
+        'original_language': tmdb_tv_response['original_language'],
+        'poster_url': f"{TMDB_IMAGE_URL}/w1280{tmdb_tv_response['poster_path']}"
+    }
+
+TMDB_RECORDS = {'movie': movie_record, 'tv': tv_record}
+
+@traced('tmdb.movie')
+def fetch_tmdb_movie_data(tmdb_id, media_type='movie'):
+    cache = get_cache()
+    cached = cache.get_metadata(media_type, tmdb_id)
+    record_cache(f'tmdb_{media_type}', cached is not None)
+    if cached is None:
+        cached = tmdb_requests.do((media_type, str(tmdb_id)), lambda: download_tmdb_movie_data(tmdb_id, media_type))
+    return {**cached, 'media_type': media_type}
+
+def download_tmdb_movie_data(tmdb_id, media_type='movie'):
+    cache = get_cache()
+    tmdb_url = f'{TMDB_API_URL}/{media_type}/{tmdb_id}?api_key={TMDB_API_KEY}'
+    response = http_client.get(tmdb_url, limiter=tmdb_limiter)
+    response.raise_for_status()
+    movie_data = TMDB_RECORDS[media_type](tmdb_id, response.json())
+    cache.set_metadata(media_type, tmdb_id, movie_data)
+    return movie_data
+
+def search_tmdb_movie_id(title, release_year=None):
+    # for sources without TMDB ids, e.g. the Letterboxd CSV export
+    cache = get_cache()
+    key = f'{title}|{release_year or ""}'
+    cached = cache.get_metadata('search', key)
+    record_cache('tmdb_search', cached is not None)
+    if cached is not None:
+        return cached['id']
+    return tmdb_requests.do(('search', key), lambda: download_tmdb_movie_id(title, release_year))
+
+def download_tmdb_movie_id(title, release_year=None):
+    cache = get_cache()
+    key = f'{title}|{release_year or ""}'
+    params = {'api_key': TMDB_API_KEY, 'query': title}
+    if release_year:
+        params['year'] = release_year
+    response = http_client.get(f'{TMDB_API_URL}/search/movie', params=params, limiter=tmdb_limiter)
+    response.raise_for_status()
+    results = response.json().get('results', [])
+    tmdb_id = str(results[0]['id']) if results else None
+    cache.set_metadata('search', key, {'id': tmdb_id})
+    return tmdb_id
+
+def fetch_tmdb_movie_data_or_none(tmdb_key):
+    # one bad id shouldn't sink the rest of the diary
+    tmdb_id, media_type = tmdb_key
+    try:
+        return fetch_tmdb_movie_data(tmdb_id, media_type)
+    except Exception as e:
+        logger.warning('TMDB lookup failed for %s %s: %r', media_type, tmdb_id, e)
+        return None
+
+def fetch_tmdb_movies(tmdb_keys, max_workers=TMDB_MAX_WORKERS):
+    # (tmdb_id, media_type) pairs in, records in the same order out, None where the lookup failed
+    if len(tmdb_keys) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tmdb_keys))) as executor:
+        return list(executor.map(fetch_tmdb_movie_data_or_none, tmdb_keys))
+
+def tmdb_keys(letterboxd_df):
+    return list(letterboxd_df[TMDB_KEY].dropna().drop_duplicates().itertuples(index=False, name=None))
+
+def build_letterboxd_frame(letterboxd_data):
+    letterboxd_df = pd.DataFrame(letterboxd_data, columns=LETTERBOXD_COLUMNS)
     letterboxd_df['logDate'] = pd.to_datetime(letterboxd_df['logDate'], format='ISO8601', utc=True)
     letterboxd_df['memberRating'] = letterboxd_df['memberRating'].astype(float)
+    letterboxd_df['rewatch'] = letterboxd_df['rewatch'].fillna(False).astype(bool)
+    return letterboxd_df
+
+def build_tmdb_frame(tmdb_data):
+    tmdb_df = pd.DataFrame([record for record in tmdb_data if record is not None], columns=TMDB_COLUMNS)
+    tmdb_df['release_date'] = pd.to_datetime(tmdb_df['release_date'], format='ISO8601', utc=True)
+    return tmdb_df
+
+def indexed_tmdb_frame(tmdb_keys):
+    # the index only holds movies
+    movie_ids = [tmdb_id for tmdb_id, media_type in tmdb_keys if media_type == 'movie']
+    index = get_index()
+    if index is None or not movie_ids:
+        return build_tmdb_frame([])
+    tmdb_df = index.lookup(movie_ids)
+    tmdb_df['media_type'] = 'movie'
+    # same url movie_record builds
+    tmdb_df['poster_url'] = tmdb_df['poster_path'].map(lambda poster_path: f'{TMDB_IMAGE_URL}/w1280{poster_path}')
+    tmdb_df['release_date'] = pd.to_datetime(tmdb_df['release_date'], format='ISO8601', utc=True)
+    return tmdb_df[TMDB_COLUMNS]
+
+def fetch_tmdb_frame(tmdb_keys):
+    # films in the local index come from one query, only the rest go to TMDB;
+    # keys whose lookup failed are simply missing from the frame
+    indexed_df = indexed_tmdb_frame(tmdb_keys)
+    if indexed_df.empty:
+        return build_tmdb_frame(fetch_tmdb_movies(tmdb_keys))
+    indexed_ids = set(indexed_df['id'])
+    missing_keys = [key for key in tmdb_keys if key[1] != 'movie' or key[0] not in indexed_ids]
+    if not missing_keys:
+        return indexed_df
+    return pd.concat([indexed_df, build_tmdb_frame(fetch_tmdb_movies(missing_keys))], ignore_index=True)
+
+@traced('merge')
+def merge_tmdb_data(letterboxd_df, tmdb_df):
+    return letterboxd_df.merge(tmdb_df, left_on=TMDB_KEY, right_on=['id', 'media_type'])
+
+def take_year(items, year):
+    # the feed is ordered by when entries were logged, not by the watched date,
+    # so a backfilled older viewing can sit between entries from the year
+    for item in items:
+        if item['logDate'] and int(item['logDate'][:4]) == year:
+            yield item
+
+def get_movie_data_from_rss_feed(url, year=None, streaming=True):
+    if streaming:
+        items = stream_rss_feed(url)
+        letterboxd_data = list(take_year(items, year) if year else items)
+    else:
+        root = fetch_rss_feed(url)
+        letterboxd_data = [parse_movie_data(item) for item in root.findall('.//item')]
+    return enrich_letterboxd_data(letterboxd_data, year)
+
+def get_movie_data_from_rss_file(path, year=None):
+    with open(path, 'rb') as f:
+        return enrich_letterboxd_data(list(iter_rss_items(f)), year)
+
+def enrich_letterboxd_data(letterboxd_data, year=None):
+    letterboxd_df = build_letterboxd_frame(letterboxd_data)
     
     if year:
         letterboxd_df = letterboxd_df[letterboxd_df['logDate'].dt.year == year]
     
-    tmdb_ids = letterboxd_df['tmdb_id'].unique()
-    
-    tmdb_data = []
-    for tmdb_id in tmdb_ids:
-        tmdb_data.append(fetch_tmdb_movie_data(tmdb_id))
-    
-    tmdb_df = pd.DataFrame(tmdb_data)
-    tmdb_df['release_date'] = pd.to_datetime(tmdb_df['release_date'], format='ISO8601', utc=True)
+    tmdb_df = fetch_tmdb_frame(tmdb_keys(letterboxd_df))
 
-    merged_df = letterboxd_df.merge(tmdb_df, left_on='tmdb_id', right_on='id')
+    merged_df = merge_tmdb_data(letterboxd_df, tmdb_df)
     
-    return merged_df
+    return build_movie_frame(merged_df)
 
 # Usage
 # url = 'https://letterboxd.com/username/rss/'
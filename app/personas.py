@@ -0,0 +1,108 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.schema import GENRE_PREFIX, reviewed_mask
+
+# Personas ("vibes") are declared as data. Each rule is "feature": weight,
+# where a feature is a yes/no question about a diary entry:
+#   released_before:<year>   released_in_year   decade:<1970>
+#   language_not:<code>      genre:<Name>       rewatch   reviewed
+#   rating_at_least:<stars>  rating_at_most:<stars>      runtime_at_least:<minutes>
+# A persona's score is the weighted share of the year's entries answering
+# yes, minus its baseline (roughly what an ordinary diary scores), so personas
+# built on common traits don't win every time. Every feature is evaluated once
+# per frame and all personas are scored with one matrix product.
+# PERSONAS_PATH can point at a JSON file with a list in the same shape. The
+# winning name is drawn on the story poster, so keep names short.
+DEFAULT_PERSONAS = [
+    {'name': 'Old Soul', 'baseline': 0.3, 'rules': {'released_before:2000': 1.0}},
+    {'name': 'Popcorn Enjoyer', 'baseline': 0.15, 'rules': {'released_in_year': 1.0}},
+    {'name': 'Globe Trotter', 'baseline': 0.25, 'rules': {'language_not:en': 1.0}},
+    {'name': 'Classicist', 'baseline': 0.05, 'rules': {'released_before:1960': 1.0}},
+    {'name': 'Horror Hound', 'baseline': 0.1, 'rules': {'genre:Horror': 1.0}},
+    {'name': 'Romantic', 'baseline': 0.15, 'rules': {'genre:Romance': 0.6, 'genre:Comedy': 0.4}},
+    {'name': 'Doc Devotee', 'baseline': 0.05, 'rules': {'genre:Documentary': 1.0}},
+    {'name': 'Animation Fan', 'baseline': 0.08, 'rules': {'genre:Animation': 1.0}},
+    {'name': 'Epic Enthusiast', 'baseline': 0.1, 'rules': {'runtime_at_least:150': 1.0}},
+    {'name': 'Tough Critic', 'baseline': 0.15, 'rules': {'rating_at_most:2': 1.0}},
+    {'name': 'Easy to Please', 'baseline': 0.45, 'rules': {'rating_at_least:4': 1.0}},
+    {'name': 'Rewatcher', 'baseline': 0.1, 'rules': {'rewatch': 1.0}},
+    {'name': 'Wordsmith', 'baseline': 0.5, 'rules': {'reviewed': 1.0}},
+]
+PERSONAS_PATH = os.getenv('PERSONAS_PATH')
+
+
+def load_personas(path=PERSONAS_PATH):
+    if not path:
+        return DEFAULT_PERSONAS
+    with open(path) as f:
+        return json.load(f)
+
+
+def feature_column(df, feature, year):
+    kind, _, arg = feature.partition(':')
+    if kind == 'genre':
+        column = f'{GENRE_PREFIX}{arg}'
+        # batches of diaries don't share every genre column, missing means no
+        return df[column].fillna(False).to_numpy(dtype=bool) if column in df.columns else np.zeros(len(df), dtype=bool)
+    if kind == 'released_before':
+        return (df['release_date'].dt.year < int(arg)).to_numpy()
+    if kind == 'released_in_year':
+        return (df['release_date'].dt.year == year).to_numpy()
+    if kind == 'decade':
+        return (df['release_date'].dt.year // 10 * 10 == int(arg)).to_numpy()
+    if kind == 'language_not':
+        return (df['original_language'] != arg).to_numpy()
+    if kind == 'rating_at_least':
+        return (df['memberRating'] >= float(arg)).to_numpy()
+    if kind == 'rating_at_most':
+        return (df['memberRating'] <= float(arg)).to_numpy()
+    if kind == 'runtime_at_least':
+        return (df['runtime'] >= int(arg)).fillna(False).to_numpy(dtype=bool)
+    if kind == 'rewatch':
+        return df['rewatch'].to_numpy(dtype=bool) if 'rewatch' in df.columns else np.zeros(len(df), dtype=bool)
+    if kind == 'reviewed':
+        return reviewed_mask(df['description']).to_numpy(dtype=bool)
+    raise ValueError(f'unknown persona feature {feature!r}')
+
+
+class PersonaModel:
+    def __init__(self, personas):
+        self.names = [persona['name'] for persona in personas]
+        self.features = sorted({feature for persona in personas for feature in persona['rules']})
+        position = {feature: i for i, feature in enumerate(self.features)}
+        # features x personas
+        self.weights = np.zeros((len(self.features), len(personas)), dtype=np.float32)
+        for j, persona in enumerate(personas):
+            for feature, weight in persona['rules'].items():
+                self.weights[position[feature], j] = weight
+        self.baselines = np.array([persona.get('baseline', 0.0) for persona in personas], dtype=np.float32)
+
+    def feature_matrix(self, df, year):
+        # entries x features, one column per distinct feature across all personas
+        matrix = np.empty((len(df), len(self.features)), dtype=np.float32)
+        for i, feature in enumerate(self.features):
+            matrix[:, i] = feature_column(df, feature, year)
+        return matrix
+
+    def score(self, df, year):
+        shares = self.feature_matrix(df, year).mean(axis=0) if len(df) else np.zeros(len(self.features), np.float32)
+        scores = shares @ self.weights - self.baselines
+        return pd.Series(scores.astype(float).round(4), index=self.names, name='score')
+
+
+_model = None
+
+
+def get_model():
+    global _model
+    if _model is None:
+        _model = PersonaModel(load_personas())
+    return _model
+
+
+def persona_scores(movie_df, year):
+    return get_model().score(movie_df, year)
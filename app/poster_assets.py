@@ -0,0 +1,131 @@
+import functools
+import hashlib
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from app import http_client
+from app.files import WriteCounter, atomic_write, prune_directory
+from app.tmdb_cache import CACHE_DIR, get_cache
+from app.tracing import record_cache, traced
+
+# Poster thumbnails for the story, fetched at the smallest TMDB size that still
+# covers the target box and cached on disk already resized and masked. The
+# least recently used are removed once the directory grows past
+# THUMBNAIL_CACHE_MAX_BYTES.
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, 'thumbnails')
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+TMDB_POSTER_WIDTHS = [92, 154, 185, 342, 500, 780]
+_TMDB_SIZE_SEGMENT = re.compile(r'/(w\d+|original)/')
+# sessions rendering the same poster at the same time share one download
+poster_requests = http_client.SingleFlight()
+# and one decode and write of each thumbnail
+thumbnail_builds = http_client.SingleFlight()
+
+# only prune every few writes, it needs a walk of the directory
+PRUNE_EVERY = 50
+_writes = WriteCounter(PRUNE_EVERY)
+
+
+def tmdb_poster_size(target_width):
+    for width in TMDB_POSTER_WIDTHS:
+        if width >= target_width:
+            return f'w{width}'
+    return 'original'
+
+
+def sized_poster_url(poster_url, target_width):
+    return _TMDB_SIZE_SEGMENT.sub(f'/{tmdb_poster_size(target_width)}/', poster_url, count=1)
+
+
+@traced('poster.fetch')
+def fetch_poster_bytes(poster_url):
+    data = get_cache().get_poster(poster_url)
+    record_cache('poster', data is not None)
+    if data is None:
+        data = poster_requests.do(poster_url, lambda: download_poster_bytes(poster_url))
+    return data
+
+
+def download_poster_bytes(poster_url):
+    response = http_client.get(poster_url)
+    response.raise_for_status()
+    get_cache().set_poster(poster_url, response.content)
+    return response.content
+
+
+@functools.lru_cache
+def rounded_mask(size, radius):
+    mask = Image.new('L', size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle([0, 0, size[0], size[1]], radius=radius, fill=255)
+    return mask
+
+
+def decode_thumbnail(data, size, radius):
+    poster = Image.open(io.BytesIO(data))
+    # let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while it decodes
+    poster.draft('RGB', size)
+    poster = poster.convert('RGB').resize(size, Image.LANCZOS, reducing_gap=2.0).convert('RGBA')
+    poster.putalpha(rounded_mask(size, radius))
+    return poster
+
+
+def thumbnail_path(poster_url, size, radius):
+    # keyed on the poster path alone so every TMDB size/host maps to one file
+    poster_path = _TMDB_SIZE_SEGMENT.split(poster_url)[-1]
+    key = hashlib.sha1(f'{poster_path}:{size[0]}x{size[1]}:{radius}'.encode()).hexdigest()
+    return os.path.join(THUMBNAIL_DIR, key[:2], f'{key}.png')
+
+
+def read_thumbnail(path):
+    try:
+        with Image.open(path) as cached:
+            poster = cached.copy()
+    except FileNotFoundError:
+        return None
+    # pruning goes by modification time, so a hit keeps the file around
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return poster
+
+
+def build_thumbnail(poster_url, size, radius, path):
+    poster = decode_thumbnail(fetch_poster_bytes(sized_poster_url(poster_url, size[0])), size, radius)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, lambda tmp_path: poster.save(tmp_path, format='PNG'))
+    if _writes.due():
+        prune_thumbnails()
+    return poster
+
+
+def prune_thumbnails(max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+    prune_directory(THUMBNAIL_DIR, max_bytes)
+
+
+def load_thumbnail(poster_url, size, radius):
+    path = thumbnail_path(poster_url, size, radius)
+    poster = read_thumbnail(path)
+    if poster is None:
+        # every caller gets its own copy of the shared build to draw with
+        poster = thumbnail_builds.do(path, lambda: build_thumbnail(poster_url, size, radius, path)).copy()
+    return poster
+
+
+def _load_thumbnail_or_none(args):
+    try:
+        return load_thumbnail(*args)
+    except Exception:
+        return None
+
+
+def load_thumbnails(poster_urls, size, radius, max_workers=3):
+    # one entry per url, None where the poster couldn't be fetched or decoded
+    if not poster_urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(poster_urls))) as executor:
+        return list(executor.map(_load_thumbnail_or_none, [(url, size, radius) for url in poster_urls]))
@@ -1,8 +1,12 @@
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+from PIL import Image, ImageDraw
 import io
-import requests
 from typing import List, Dict
-from app.visualisations import vibe_calculator
+from app.fonts import all_fonts_loaded, load_fonts
+from app.chart_cache import aggregate_key
+from app.poster_assets import load_thumbnails, rounded_mask
+from app.poster_output import POSTER_FORMAT, POSTER_QUALITY, encode_poster, load_story, save_story
+from app.stats import get_year_stats
+from app.tracing import span, traced
 import functools
 import os
 
@@ -14,181 +18,183 @@ BLUE = (102,185,239)
 WHITE = (255, 255, 255)
 GREEN = "#66dd68"
 
-@functools.lru_cache
-def get_font_from_url(font_url):
-    response = requests.get(font_url)
-    return response.content
-
-
-def webfont(font_url):
-    return io.BytesIO(get_font_from_url(font_url))
-
-@functools.lru_cache
-def load_all_fonts_from_web():
-    emoji_font_url = 'https://github.com/google/fonts/blob/main/ofl/notoemoji/NotoEmoji%5Bwght%5D.ttf?raw=true'
-    libre_url = 'https://github.com/google/fonts/blob/main/ofl/librebaskerville/LibreBaskerville-Bold.ttf?raw=true'
-    roboto_black_url = 'https://github.com/openmaptiles/fonts/blob/master/roboto/Roboto-Black.ttf?raw=true'
-    roboto_bold_url = 'https://github.com/openmaptiles/fonts/blob/master/roboto/Roboto-Bold.ttf?raw=true'
-
-    font_dict = {
-        'emoji_font': (emoji_font_url, 30),
-        'font_highlights': (libre_url, 50),
-        'font_numbers': (libre_url, 70),
-        'font_numbers_medium': (libre_url, 40),
-        'font_small': (roboto_bold_url, 40),
-        'font_text': (roboto_bold_url, 30),
-        'font_large': (roboto_black_url, 70),  
-    }
-    for key, (font_url, size) in font_dict.items():
-        font_dict[key] = ImageFont.truetype(webfont(font_url), size)
-
-    return font_dict
-
-
 # Set up image size
 width, height = 1080, 1920
 
 def create_circle(draw, xy, radius, fill):
     draw.ellipse((xy[0]-radius, xy[1]-radius, xy[0]+radius, xy[1]+radius), fill=fill)
 
-def add_rounded_corners(image, radius):
-    # Create a mask with rounded corners
-    mask = Image.new('L', image.size, 0)
-    draw = ImageDraw.Draw(mask)
-    draw.rounded_rectangle([0, 0, image.size[0], image.size[1]], radius=radius, fill=255)
-    
-    # Apply the mask to the image
-    rounded_image = ImageOps.fit(image, image.size, centering=(0.5, 0.5))
-    rounded_image.putalpha(mask)
-    
-    return rounded_image
+THEMES = {
+    'default': {
+        'background': GREEN,
+        'panel': BLACK,
+        'lower_panel': WHITE,
+        'circles': [BLUE, GREEN, ORANGE],
+        'heading': ORANGE,
+        'text': BLACK,
+        'title': SKYBLUE,
+        'poster_fallback': ORANGE,
+    },
+}
+
+margin = 50
+left_margin = 100
+top_margin = height // 2
+circle_radius = 130
+circle_labels = ["Films Logged", "Films Reviewed", "New Releases"]
+poster_size = (250, 374)  # Increased size for better visibility
+poster_radius = 30
+# part of every cached story's key, bump it when the layout changes
+LAYOUT_VERSION = 1
+
+def circle_center(i):
+    circle_spacing = (circle_radius * 2) + 50
+    return (width//2) + (-1+i) * circle_spacing, top_margin
+
+@functools.lru_cache
+def load_qr_code():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    qr_code = Image.open(os.path.join(base_dir, '..', 'static/qr_code.png'))
+    return qr_code.resize((100, 100))
 
-def create_poster(username, movie_df, year, top3_movies):
-    # Create a new image with a black background
-    image = Image.new('RGB', (width, height), GREEN)
+@functools.lru_cache
+def base_template(theme='default', fonts_loaded=True):
+    # everything that doesn't depend on the user, drawn once per process and theme;
+    # fonts_loaded only keys the cache, so a template drawn with stand-in fonts
+    # isn't reused once the real ones load
+    colors = THEMES[theme]
+    fonts = load_fonts()
+    image = Image.new('RGB', (width, height), colors['background'])
     draw = ImageDraw.Draw(image)
 
     # Draw purple background
-    margin = 50
-    draw.rectangle([margin, margin, width - margin, height - margin], fill=BLACK)
-    draw.rectangle([margin, height//2, width - margin, height - margin], fill=WHITE)
+    draw.rectangle([margin, margin, width - margin, height - margin], fill=colors['panel'])
+    draw.rectangle([margin, height//2, width - margin, height - margin], fill=colors['lower_panel'])
 
+    #draw three circles distributed horizontally
+    for i, label in enumerate(circle_labels):
+        circle_x, circle_y = circle_center(i)
+        create_circle(draw, (circle_x, circle_y), circle_radius, colors['circles'][i])
 
-    fonts = load_all_fonts_from_web()
+        bbox_label = draw.textbbox((0, 0), label, font=fonts['font_small'])
+        text_width_label = bbox_label[2] - bbox_label[0]
+        text_x_label = circle_x - (text_width_label // 2)
+        draw.text((text_x_label, circle_y+160), label, font=fonts['font_small'], fill=colors['text'])
+
+    # Headings
+    draw.text((left_margin, top_margin + 280), "Top Genres", font=fonts['font_small'], fill=colors['heading'])
+    draw.text((left_margin, top_margin + 590), "Minutes Watched", font=fonts['font_small'], fill=colors['heading'])
+    draw.text(((width // 2), top_margin + 590), "Your Vibe", font=fonts['font_small'], fill=colors['heading'])
+
+    # Add footer
+    draw.text((width//2, height - 100), "https://tinyurl.com/letterboxdbi", fill=colors['text'], font=fonts['font_text'], anchor="mm")
+    # add qr code to the footer
+    image.paste(load_qr_code(), (width - 150, height - 150))
+
+    return image
+
+@traced('poster.user_layer')
+def draw_user_layer(image, username, year, top3_movies, stats, theme='default'):
+    # returns the poster and how many films on it were drawn as placeholders
+    colors = THEMES[theme]
+    draw = ImageDraw.Draw(image)
+
+    fonts = load_fonts()
     font_small = fonts['font_small']
-    font_text = fonts['font_text']
     font_large = fonts['font_large']
     emoji_font = fonts['emoji_font']
     font_numbers = fonts['font_numbers']
     font_highlights = fonts['font_highlights']
     font_numbers_medium = fonts['font_numbers_medium']
 
-    # Draw stats
-    left_margin = 100
-    top_margin = height // 2
-
-
     # Add title
     draw.text((width//2, 170), f"{year}", fill="#FFFFFF", font=font_numbers, anchor="mt")
-    draw.text((width//2, 240), f"{username}'s Year in Film", fill=SKYBLUE, font=font_large, anchor="mt")
-
-    stats = [
-        ("Films Logged", str(movie_df.shape[0])),
-        ("Films Reviewed", str(movie_df[~movie_df['description'].str.contains('Watched on')].shape[0])),
-        ("New Releases", str(movie_df[movie_df['release_date'].dt.year == year].shape[0])),
-        # ("TOP GENRE", movie_df['genres'].explode().value_counts().idxmax())
-    ]
+    draw.text((width//2, 240), f"{username}'s Year in Film", fill=colors['title'], font=font_large, anchor="mt")
 
-    poster_size = (250, 374)  # Increased size for better visibility
-    for i, movie in enumerate(top3_movies):
+    with span('poster.thumbnails'):
+        posters = load_thumbnails([movie['image'] for movie in top3_movies], poster_size, poster_radius)
+    placeholders = sum(poster is None for poster in posters)
+    for i, (movie, rounded_poster) in enumerate(zip(top3_movies, posters)):
         x_position = width // 2 + (i - 1) * (width // 4)
         y_position = 360
 
         # Add poster
-        try:
-            poster = Image.open(requests.get(movie['image'], stream=True).raw).resize(poster_size)
-        except:
-            poster = Image.new('RGB', poster_size, ORANGE)
+        if rounded_poster is None:
+            poster = Image.new('RGBA', poster_size, colors['poster_fallback'])
             # poster text in middle of poster
             poster_draw = ImageDraw.Draw(poster)
             # Draw text on the poster
             poster_text_position = (poster_size[0] // 2, poster_size[1] // 2)
             poster_draw.text(poster_text_position, movie['title'], fill=WHITE, font=font_small, anchor="mm")
+            poster.putalpha(rounded_mask(poster_size, poster_radius))
+            rounded_poster = poster
 
-        rounded_poster = add_rounded_corners(poster, radius=30)
         image.paste(rounded_poster, (x_position - poster_size[0]//2, y_position), rounded_poster)
         
         # Add rating
         draw.text((x_position, y_position + poster_size[1] + 15), movie['caption'], fill="#FFFFFF", font=emoji_font, anchor="mt")
-    
 
-    #draw three circles distributed horizontally
-    for i, (label, value) in enumerate(stats):
-        circle_radius = 130
-        circle_spacing = (circle_radius * 2) + 50
-        circle_y = top_margin
-        circle_x = (width//2) + (-1+i) * circle_spacing
-        colors = [BLUE, GREEN, ORANGE]
-
-        create_circle(draw, (circle_x, circle_y), circle_radius, colors[i])
-        
+    circle_values = [str(stats.entries), str(stats.reviews), str(stats.new_releases)]
+    for i, value in enumerate(circle_values):
+        circle_x, circle_y = circle_center(i)
         bbox_number = draw.textbbox((0, 0),value, font=font_numbers)
         text_width_number = bbox_number[2] - bbox_number[0]
         text_x_number = circle_x - (text_width_number // 2)
-
-        bbox_label = draw.textbbox((0, 0), label, font=font_small)
-        text_width_label = bbox_label[2] - bbox_label[0]
-        text_x_label = circle_x - (text_width_label // 2)
-    
-        # Adjust the position of the text to be centered
-        
         draw.text((text_x_number, circle_y-40),value, font=font_numbers, fill=WHITE)
-        draw.text((text_x_label, circle_y+160), label, font=font_small, fill=BLACK)
-
-        
 
     # Top Genres and number of films
-    draw.text((left_margin, top_margin + 280), "Top Genres", font=font_small, fill=ORANGE)
-
-    top3_genres = movie_df['genres'].explode().value_counts().head(3)
+    top3_genres = stats.genre_counts.head(3)
     genres = top3_genres.index
     
     num_films = top3_genres.values.astype(str)
 
     for i in range(len(num_films)):
-        draw.text((left_margin, top_margin + 350 + i*60), f"{genres[i]}", font=font_small, fill=BLACK)
+        draw.text((left_margin, top_margin + 350 + i*60), f"{genres[i]}", font=font_small, fill=colors['text'])
         bbox_label = draw.textbbox((0, 0), num_films[i], font=font_small)
         text_width_label = bbox_label[2] - bbox_label[0]
         text_x_label = width - margin - 50 - text_width_label
         
-        draw.text((text_x_label, top_margin + 350 + i*60), num_films[i], font=font_numbers_medium, fill=BLACK)
-
-    # minutes_watched = f"{round(movie_df['runtime'].sum(), 1)}"
-    minutes_watched = ("{:,}".format(movie_df['runtime'].sum()))
-
-    # Minutes Listened
-    draw.text((left_margin, top_margin + 590), "Minutes Watched", font=font_small, fill=ORANGE)
-    draw.text((left_margin, top_margin + 660), minutes_watched, font=font_highlights, fill=BLACK)
-
-    # Top Genre
-    vibe = vibe_calculator(movie_df)
-    draw.text(((width // 2), top_margin + 590), "Your Vibe", font=font_small, fill=ORANGE)
-    draw.text((width // 2, top_margin + 660), vibe, font=font_highlights, fill=BLACK)
-
-    # Add footer
-    draw.text((width//2, height - 100), "https://tinyurl.com/letterboxdbi", fill=BLACK, font=font_text, anchor="mm")
-    # add qr code to the footer
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    qr_code = Image.open(os.path.join(base_dir, '..', 'static/qr_code.png'))
-
-    qr_code = qr_code.resize((100, 100))
-    image.paste(qr_code, (width - 150, height - 150))
-
-
-    # Save image to bytes
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='PNG')
-    # image.save('poster.png')
-    img_byte_arr.seek(0)
-
-    return img_byte_arr
\ No newline at end of file
+        draw.text((text_x_label, top_margin + 350 + i*60), num_films[i], font=font_numbers_medium, fill=colors['text'])
+
+    # Minutes Watched
+    minutes_watched = ("{:,}".format(stats.minutes_watched))
+    draw.text((left_margin, top_margin + 660), minutes_watched, font=font_highlights, fill=colors['text'])
+
+    # Your Vibe
+    draw.text((width // 2, top_margin + 660), stats.vibe, font=font_highlights, fill=colors['text'])
+
+    return image, placeholders
+
+def render_poster(username, year, top3_movies, stats, theme='default'):
+    # returns the poster and whether it came out complete: every font and film poster loaded
+    load_fonts()
+    fonts_loaded = all_fonts_loaded()
+    with span('poster.base'):
+        image = base_template(theme, fonts_loaded).copy()
+    image, placeholders = draw_user_layer(image, username, year, top3_movies, stats, theme)
+    return image, fonts_loaded and not placeholders
+
+def story_cache_key(username, year, top3_movies, stats, theme, fmt, quality):
+    # everything draw_user_layer puts on the poster, nothing else
+    return aggregate_key(
+        LAYOUT_VERSION, username, year, top3_movies, stats.entries, stats.reviews, stats.new_releases,
+        stats.genre_counts.head(3), stats.minutes_watched, stats.vibe, theme, fmt, quality,
+    )
+
+@traced('poster.total')
+def create_poster(username, movie_df, year, top3_movies, stats=None, theme='default',
+                  fmt=POSTER_FORMAT, quality=POSTER_QUALITY, cache=True):
+    if stats is None:
+        stats = get_year_stats(username, year, movie_df)
+
+    key = story_cache_key(username, year, top3_movies, stats, theme, fmt, quality) if cache else None
+    data = load_story(key, fmt) if cache else None
+    if data is None:
+        image, complete = render_poster(username, year, top3_movies, stats, theme)
+        with span('poster.encode'):
+            data = encode_poster(image, fmt, quality)
+        # don't keep a story drawn with placeholder posters or stand-in fonts
+        if cache and complete:
+            save_story(key, fmt, data)
+
+    return io.BytesIO(data)
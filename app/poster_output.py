@@ -0,0 +1,99 @@
+import io
+import os
+from collections import namedtuple
+
+from PIL import Image
+
+from app.files import WriteCounter, prune_directory, write_bytes
+from app.tmdb_cache import CACHE_DIR
+from app.tracing import record_cache, span
+
+# Encoded story posters, cached on disk under a hash of everything drawn on
+# them plus the encoder settings, so a repeat "Generate Story" for the same
+# stats skips both rendering and encoding. Files are shared by every worker
+# process; the oldest are removed once the directory grows past
+# STORY_CACHE_MAX_BYTES.
+STORY_DIR = os.path.join(CACHE_DIR, 'stories')
+STORY_CACHE_MAX_BYTES = int(os.getenv('STORY_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# png: lossless, optimized; png8: 256-colour palette, a fraction of the size;
+# webp and jpeg take POSTER_QUALITY (webp at 100 is lossless)
+POSTER_FORMAT = os.getenv('POSTER_FORMAT', 'png')
+POSTER_QUALITY = int(os.getenv('POSTER_QUALITY', '85'))
+
+# only prune every few writes, it needs a walk of the directory
+PRUNE_EVERY = 50
+
+Encoder = namedtuple('Encoder', ['extension', 'mime', 'save'])
+
+
+def save_png(image, f, quality):
+    image.save(f, format='PNG', optimize=True)
+
+
+def save_png8(image, f, quality):
+    # the poster is mostly flat colour and text, which a 256-colour palette holds
+    # exactly; Pillow only dithers against a given palette, so the film posters
+    # are mapped to their nearest colours without dithering
+    image.quantize(256, method=Image.Quantize.FASTOCTREE).save(f, format='PNG', optimize=True)
+
+
+def save_webp(image, f, quality):
+    if quality >= 100:
+        image.save(f, format='WEBP', lossless=True, method=4)
+    else:
+        image.save(f, format='WEBP', quality=quality, method=4)
+
+
+def save_jpeg(image, f, quality):
+    image.save(f, format='JPEG', quality=quality, optimize=True)
+
+
+ENCODERS = {
+    'png': Encoder('png', 'image/png', save_png),
+    'png8': Encoder('png', 'image/png', save_png8),
+    'webp': Encoder('webp', 'image/webp', save_webp),
+    'jpeg': Encoder('jpg', 'image/jpeg', save_jpeg),
+}
+
+
+def encode_poster(image, fmt=POSTER_FORMAT, quality=POSTER_QUALITY):
+    f = io.BytesIO()
+    with span(f'poster.encode.{fmt}'):
+        ENCODERS[fmt].save(image, f, quality)
+    return f.getvalue()
+
+
+def story_path(key, fmt):
+    return os.path.join(STORY_DIR, key[:2], f'{key}.{ENCODERS[fmt].extension}')
+
+
+_writes = WriteCounter(PRUNE_EVERY)
+
+
+def load_story(key, fmt):
+    path = story_path(key, fmt)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        record_cache('story', False)
+        return None
+    record_cache('story', True)
+    # pruning goes by modification time, so a hit keeps the file around
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return data
+
+
+def save_story(key, fmt, data):
+    path = story_path(key, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_bytes(path, data)
+    if _writes.due():
+        prune_stories()
+
+
+def prune_stories(max_bytes=STORY_CACHE_MAX_BYTES):
+    prune_directory(STORY_DIR, max_bytes)
@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.diary_store import load_user_diary
+from app.frame_cache import frame_cache
+from app.poster_assets import load_thumbnails
+from app.poster_generator import poster_radius, poster_size
+from app.stats import FeedStats, diary_years, get_year_stats, year_slice
+
+logger = logging.getLogger(__name__)
+
+# Diary loads run on a process-wide executor rather than inside the Streamlit
+# script, so a load keeps going across reruns and the page can render whatever
+# has arrived so far: feed KPIs first, then the enriched stats.
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '4'))
+# how long a finished load is reused before the next visit syncs the feed again
+PREFETCH_TTL = float(os.getenv('PREFETCH_TTL', '300'))
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class DiaryJob:
+    # the user's whole diary, loaded and enriched once; each year is a slice of it.
+    # The frame itself is kept in the frame cache rather than on the job, so
+    # memory stays bounded however many users have jobs around.
+    def __init__(self, username, year):
+        self.username = username
+        self.key = username.lower()
+        # the year to warm posters for, any other year can be sliced out afterwards
+        self.year = year
+        self.started = time.perf_counter()
+        self.finished_at = None
+        self.timings = {}
+        self.feed_df = None
+        self.years = []
+        self.error = None
+        self.done = threading.Event()
+        self._reload_lock = threading.Lock()
+
+    def mark(self, stage):
+        # seconds since the username was submitted; only the first time counts
+        # when several reruns or sessions reach the same stage
+        self.timings.setdefault(stage, round(time.perf_counter() - self.started, 3))
+
+    def on_feed(self, feed_df):
+        self.feed_df = feed_df
+        self.mark('feed')
+
+    def feed_stats(self, year):
+        feed_df = self.feed_df
+        if feed_df is None:
+            return None
+        return FeedStats.from_feed(year_slice(feed_df, year), year)
+
+    def run(self):
+        try:
+            diary_df = load_user_diary(self.username, on_feed=self.on_feed)
+            frame_cache.put(self.key, diary_df)
+            self.years = diary_years(diary_df)
+            self.mark('enriched')
+            stats = get_year_stats(self.username, self.year, year_slice(diary_df, self.year))
+            self.mark('stats')
+            # warm the poster cache so "Generate Story" doesn't wait on TMDB images
+            load_thumbnails([movie['image'] for movie in stats.top3], poster_size, poster_radius)
+            self.mark('posters')
+        except Exception as e:
+            logger.exception('Loading %s failed', self.username)
+            self.error = e
+        finally:
+            self.finished_at = time.monotonic()
+            self.done.set()
+            # only the partial view reads the feed columns, and only while loading
+            self.feed_df = None
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    @property
+    def diary_df(self):
+        diary_df = frame_cache.get(self.key)
+        if diary_df is None:
+            # expired or pruned from the cache; the diary store makes reloading a conditional request
+            with self._reload_lock:
+                diary_df = frame_cache.get(self.key)
+                if diary_df is None:
+                    diary_df = load_user_diary(self.username)
+                    frame_cache.put(self.key, diary_df)
+        return diary_df
+
+    def year_frame(self, year):
+        return year_slice(self.diary_df, year)
+
+    def year_stats(self, year):
+        return get_year_stats(self.username, year, self.year_frame(year))
+
+    def expired(self):
+        return self.finished_at is not None and (self.error is not None or time.monotonic() - self.finished_at > PREFETCH_TTL)
+
+    def record_render(self, stage):
+        if stage in self.timings:
+            return
+        self.mark(stage)
+        if stage == 'complete':
+            logger.info('%s %s: first KPI %ss, complete %ss (%s)', self.username, self.year,
+                        self.timings.get('first_kpi'), self.timings['complete'], self.timings)
+
+
+def start_prefetch(username, year):
+    key = username.lower()
+    with _jobs_lock:
+        for job_key in [k for k, job in _jobs.items() if job.expired()]:
+            del _jobs[job_key]
+        job = _jobs.get(key)
+        if job is None:
+            job = _jobs[key] = DiaryJob(username, year)
+            _executor.submit(job.run)
+    return job
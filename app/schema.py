@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Canonical, compact layout of a user's enriched diary.
+# Genres are stored as one boolean column per genre ("genre:Drama", ...)
+# so counts are column sums instead of explode().value_counts().
+GENRE_PREFIX = 'genre:'
+STRING = 'string[pyarrow]'
+
+MOVIE_DTYPES = {
+    'guid': STRING,
+    'title': STRING,
+    'memberRating': 'float32',
+    'rewatch': 'bool',
+    'tmdb_id': 'int32',
+    'media_type': 'category',
+    'description': STRING,
+    'original_title': STRING,
+    'runtime': 'Int32',
+    'original_language': 'category',
+    'poster_url': STRING,
+}
+
+
+def genre_matrix(genres):
+    exploded = genres.explode().dropna()
+    if exploded.empty:
+        return pd.DataFrame(index=genres.index)
+    matrix = pd.crosstab(exploded.index, exploded).gt(0)
+    matrix = matrix.reindex(genres.index, fill_value=False)
+    matrix.columns = [f'{GENRE_PREFIX}{genre}' for genre in matrix.columns]
+    return matrix.astype(bool)
+
+
+def build_movie_frame(merged_df):
+    merged_df = merged_df.reset_index(drop=True)
+    typed_df = merged_df.drop(columns=['id', 'genres'], errors='ignore')
+    dtypes = {column: dtype for column, dtype in MOVIE_DTYPES.items() if column in typed_df.columns}
+    if 'tmdb_id' in dtypes:
+        typed_df['tmdb_id'] = pd.to_numeric(typed_df['tmdb_id'])
+    typed_df = typed_df.astype(dtypes)
+    if 'genres' in merged_df.columns:
+        typed_df = pd.concat([typed_df, genre_matrix(merged_df['genres'])], axis=1)
+    return typed_df
+
+
+def reviewed_mask(description):
+    # unreviewed entries only carry the "Watched on ..." line
+    return ~description.str.contains('Watched on', regex=False).fillna(False)
+
+
+def genre_columns(df):
+    return [column for column in df.columns if column.startswith(GENRE_PREFIX)]
+
+
+def genre_counts(df):
+    # same shape as df['genres'].explode().value_counts(): index 'genres', name 'count'
+    columns = genre_columns(df)
+    totals = df[columns].to_numpy().sum(axis=0)
+    order = np.argsort(-totals, kind='stable')
+    order = order[totals[order] > 0]
+    return pd.Series(
+        totals[order].astype('int64'),
+        index=pd.Index([columns[i][len(GENRE_PREFIX):] for i in order], name='genres'),
+        name='count',
+    )
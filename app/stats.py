@@ -0,0 +1,162 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from app.personas import persona_scores
+from app.schema import genre_counts, reviewed_mask
+from app.tracing import record_cache, traced
+
+STATS_CACHE_SIZE = 256
+
+
+def rating_to_stars(rating):
+    rating = float(rating)
+    stars = '⭐️' * int(rating)
+    return stars
+
+
+def create_movie_thumbnails(movie_df: pd.DataFrame, caption: Optional[str] = None) -> List[Dict[str, str]]:
+    records = movie_df[['title', 'memberRating', 'poster_url']].to_dict(orient='records')
+    return [
+        {
+            'image': record['poster_url'],
+            'caption': caption if caption in ['First Film', 'Last Film'] else rating_to_stars(record['memberRating']),
+            'title': record['title']
+        }
+        for record in records
+    ]
+
+
+@dataclass
+class FeedStats:
+    # the part of the year that only needs the RSS feed, shown while TMDB enrichment runs
+    year: int
+    entries: int
+    reviews: int
+    rating_counts: pd.DataFrame
+
+    @classmethod
+    def from_feed(cls, feed_df, year):
+        return cls(
+            year=year,
+            entries=feed_df.shape[0],
+            reviews=int(reviewed_mask(feed_df['description']).sum()),
+            rating_counts=feed_df['memberRating'].value_counts().reset_index(),
+        )
+
+
+@dataclass
+class YearInFilmStats:
+    year: int
+    entries: int
+    reviews: int
+    new_releases: int
+    minutes_watched: int
+    hours_watched: float
+    genre_counts: pd.Series
+    rating_counts: pd.DataFrame
+    language_counts: Dict[str, int]
+    persona_scores: Dict[str, float]
+    vibe: str
+    first_film: List[Dict[str, str]]
+    last_film: List[Dict[str, str]]
+    top3: List[Dict[str, str]]
+
+    @classmethod
+    @traced('stats')
+    def from_frame(cls, movie_df, year):
+        release_year = movie_df['release_date'].dt.year
+        english = movie_df['original_language'] == 'en'
+        reviewed = reviewed_mask(movie_df['description'])
+        minutes_watched = int(movie_df['runtime'].sum())
+        new_releases = int((release_year == year).sum())
+
+        scores = persona_scores(movie_df, year)
+
+        return cls(
+            year=year,
+            entries=movie_df.shape[0],
+            reviews=int(reviewed.sum()),
+            new_releases=new_releases,
+            minutes_watched=minutes_watched,
+            hours_watched=round(minutes_watched / 60, 1),
+            genre_counts=genre_counts(movie_df),
+            rating_counts=movie_df['memberRating'].value_counts().reset_index(),
+            language_counts={'English': int(english.sum()), 'Foreign Language': int((~english).sum())},
+            persona_scores=scores.to_dict(),
+            vibe=scores.idxmax(),
+            first_film=create_movie_thumbnails(movie_df.nsmallest(1, 'logDate'), caption='First Film'),
+            last_film=create_movie_thumbnails(movie_df.nlargest(1, 'logDate'), caption='Last Film'),
+            top3=create_movie_thumbnails(movie_df.nlargest(3, 'memberRating')),
+        )
+
+    def to_dict(self):
+        # JSON-ready, for the stats API
+        return {
+            'year': self.year,
+            'entries': self.entries,
+            'reviews': self.reviews,
+            'new_releases': self.new_releases,
+            'minutes_watched': self.minutes_watched,
+            'hours_watched': self.hours_watched,
+            'genre_counts': {genre: int(count) for genre, count in self.genre_counts.items()},
+            'rating_counts': [{'rating': float(rating), 'count': int(count)}
+                              for rating, count in self.rating_counts.itertuples(index=False)],
+            'language_counts': self.language_counts,
+            'persona_scores': self.persona_scores,
+            'vibe': self.vibe,
+            'first_film': thumbnail_records(self.first_film),
+            'last_film': thumbnail_records(self.last_film),
+            'top3': thumbnail_records(self.top3),
+        }
+
+
+def thumbnail_records(thumbnails):
+    # films without a poster carry NaN, which isn't valid JSON
+    return [{key: None if pd.isna(value) else value for key, value in thumbnail.items()} for thumbnail in thumbnails]
+
+
+def diary_years(movie_df):
+    # newest year first
+    return [int(year) for year in sorted(movie_df['logDate'].dt.year.dropna().unique(), reverse=True)]
+
+
+def year_slice(movie_df, year):
+    return movie_df[movie_df['logDate'].dt.year == year]
+
+
+def yearly_summary(stats_by_year):
+    return pd.DataFrame(
+        [(stats.year, stats.entries, stats.hours_watched, stats.reviews, stats.new_releases)
+         for stats in stats_by_year],
+        columns=['year', 'entries', 'hours', 'reviews', 'new_releases'],
+    ).sort_values('year', ignore_index=True)
+
+
+def data_version(movie_df):
+    # cheap fingerprint of the entries, changes whenever an entry is added, removed or re-rated
+    hashed = pd.util.hash_pandas_object(movie_df[['tmdb_id', 'logDate', 'memberRating']], index=False)
+    return len(movie_df), int(hashed.sum())
+
+
+_stats_cache = OrderedDict()
+_stats_lock = threading.Lock()
+
+
+def get_year_stats(username, year, movie_df):
+    key = (username, year, data_version(movie_df))
+    with _stats_lock:
+        if key in _stats_cache:
+            _stats_cache.move_to_end(key)
+            record_cache('year_stats', True)
+            return _stats_cache[key]
+    record_cache('year_stats', False)
+    stats = YearInFilmStats.from_frame(movie_df, year)
+    with _stats_lock:
+        _stats_cache[key] = stats
+        while len(_stats_cache) > STATS_CACHE_SIZE:
+            _stats_cache.popitem(last=False)
+    return stats
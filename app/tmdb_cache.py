@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# On-disk TMDB metadata and poster cache shared by every worker process.
+# SQLite in WAL mode lets several Streamlit workers read and write the same file.
+CACHE_DIR = os.getenv('LETTERBOXDBI_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'letterboxdbi'))
+TMDB_CACHE_TTL = int(os.getenv('TMDB_CACHE_TTL', 30 * 24 * 3600))
+TMDB_CACHE_MAX_ENTRIES = int(os.getenv('TMDB_CACHE_MAX_ENTRIES', 100_000))
+POSTER_CACHE_MAX_BYTES = int(os.getenv('POSTER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# only run eviction every few writes, it needs a scan of the accessed index
+EVICT_EVERY = 100
+# cache hits are plain reads; access times are written back in batches of this
+# many, and before every eviction, which is the only thing that reads them
+TOUCH_BATCH = 100
+TOUCH_QUERIES = {
+    'metadata': 'UPDATE metadata SET accessed = ? WHERE key = ?',
+    'posters': 'UPDATE posters SET accessed = ? WHERE url = ?',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed);
+CREATE TABLE IF NOT EXISTS posters (
+    url TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posters_accessed ON posters (accessed);
+"""
+
+
+class TMDBCache:
+    def __init__(self, path, ttl=TMDB_CACHE_TTL, max_entries=TMDB_CACHE_MAX_ENTRIES,
+                 max_poster_bytes=POSTER_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_poster_bytes = max_poster_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        # table -> {key: last access} not yet written back
+        self._touched = {table: {} for table in TOUCH_QUERIES}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # sqlite connections can't be shared between threads, keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get_metadata(self, media_type, tmdb_id):
+        key = f'{media_type}:{tmdb_id}'
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute('SELECT value, created FROM metadata WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        # expired rows are replaced on the next download, or removed by evict
+        if self._expired(created, now):
+            return None
+        self._touch('metadata', key, now)
+        return json.loads(value)
+
+    def set_metadata(self, media_type, tmdb_id, data):
+        key = f'{media_type}:{tmdb_id}'
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO metadata (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(data), now, now)
+            )
+        self._maybe_evict()
+
+    def get_poster(self, url):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute('SELECT data, created FROM posters WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        data, created = row
+        if self._expired(created, now):
+            return None
+        self._touch('posters', url, now)
+        return bytes(data)
+
+    def set_poster(self, url, data):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO posters (url, data, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                (url, sqlite3.Binary(data), len(data), now, now)
+            )
+        self._maybe_evict()
+
+    def _touch(self, table, key, now):
+        with self._lock:
+            self._touched[table][key] = now
+            if len(self._touched[table]) < TOUCH_BATCH:
+                return
+        self.flush_access_times()
+
+    def flush_access_times(self):
+        with self._lock:
+            touched = self._touched
+            self._touched = {table: {} for table in TOUCH_QUERIES}
+        if not any(touched.values()):
+            return
+        with self._connect() as conn:
+            for table, accessed in touched.items():
+                conn.executemany(TOUCH_QUERIES[table], [(now, key) for key, now in accessed.items()])
+
+    def _maybe_evict(self):
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        # least recently used is only right once the pending access times are in
+        self.flush_access_times()
+        now = time.time()
+        with self._connect() as conn:
+            if self.ttl > 0:
+                conn.execute('DELETE FROM metadata WHERE created < ?', (now - self.ttl,))
+                conn.execute('DELETE FROM posters WHERE created < ?', (now - self.ttl,))
+            # least recently used entries beyond the size bounds
+            conn.execute(
+                'DELETE FROM metadata WHERE key IN '
+                '(SELECT key FROM metadata ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            conn.execute(
+                'DELETE FROM posters WHERE url IN (SELECT url FROM '
+                '(SELECT url, SUM(size) OVER (ORDER BY accessed DESC) AS total FROM posters) '
+                'WHERE total > ?)',
+                (self.max_poster_bytes,)
+            )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TMDBCache(os.path.join(CACHE_DIR, 'tmdb.sqlite3'))
+        return _cache
@@ -0,0 +1,134 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from itertools import islice
+
+import pandas as pd
+
+from app.tmdb_cache import CACHE_DIR
+
+# Local TMDB metadata index, seeded offline from a JSONL dump of movie details
+# (one /3/movie/{id} response per line, optionally gzipped):
+#   python -m app.tmdb_index movies.jsonl.gz
+# Only the fields the app reads are kept. Enrichment looks every film of a
+# diary up here in a single query and only goes to TMDB for the misses.
+# TMDB's daily id export lists ids and titles but no runtime or genres, so it
+# has to be expanded to full details before it can seed the index.
+INDEX_PATH = os.getenv('TMDB_INDEX_PATH', os.path.join(CACHE_DIR, 'tmdb_index.sqlite'))
+INDEX_FIELDS = ['original_title', 'runtime', 'genres', 'release_date', 'original_language', 'poster_path']
+SEED_BATCH_ROWS = 10_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    original_title TEXT,
+    runtime INTEGER,
+    genres TEXT NOT NULL,
+    release_date TEXT,
+    original_language TEXT,
+    poster_path TEXT
+);
+"""
+
+LOOKUP_QUERY = (
+    f"SELECT id, {', '.join(INDEX_FIELDS)} FROM movies "
+    "WHERE id IN (SELECT value FROM json_each(?))"
+)
+
+
+def index_row(movie):
+    # None for records missing any of the fields we need, e.g. lines of the daily id export
+    if 'id' not in movie or any(field not in movie for field in INDEX_FIELDS):
+        return None
+    genres = [genre['name'] if isinstance(genre, dict) else genre for genre in movie['genres'] or []]
+    return (
+        int(movie['id']), movie['original_title'], movie['runtime'], '|'.join(genres),
+        movie['release_date'] or None, movie['original_language'], movie['poster_path'],
+    )
+
+
+def read_jsonl(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class TMDBIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def seed(self, movies, batch_rows=SEED_BATCH_ROWS):
+        conn = self._connect()
+        written = skipped = 0
+        movies = iter(movies)
+        while True:
+            batch = list(islice(movies, batch_rows))
+            if not batch:
+                break
+            rows = [row for row in map(index_row, batch) if row is not None]
+            skipped += len(batch) - len(rows)
+            with conn:
+                conn.executemany(f"INSERT OR REPLACE INTO movies VALUES ({', '.join('?' * 7)})", rows)
+            written += len(rows)
+        return written, skipped
+
+    def lookup(self, tmdb_ids):
+        # one query for the whole batch; ids come back as the type they were asked for
+        requested = {int(tmdb_id): tmdb_id for tmdb_id in tmdb_ids if str(tmdb_id).isdigit()}
+        if not requested:
+            return pd.DataFrame(columns=['id', *INDEX_FIELDS])
+        indexed_df = pd.read_sql_query(LOOKUP_QUERY, self._connect(), params=[json.dumps(list(requested))])
+        indexed_df['id'] = indexed_df['id'].map(requested)
+        indexed_df['genres'] = [genres.split('|') if genres else [] for genres in indexed_df['genres']]
+        return indexed_df
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    # None until an index has been seeded, so enrichment skips the lookup entirely
+    global _index
+    if _index is None:
+        if not os.path.exists(INDEX_PATH):
+            return None
+        with _index_lock:
+            if _index is None:
+                _index = TMDBIndex(INDEX_PATH)
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed the local TMDB index from a JSONL dump of movie details')
+    parser.add_argument('jsonl', nargs='+', help='one TMDB movie details object per line, .gz is fine')
+    parser.add_argument('--index', default=INDEX_PATH)
+    args = parser.parse_args()
+
+    index = TMDBIndex(args.index)
+    for path in args.jsonl:
+        written, skipped = index.seed(read_jsonl(path))
+        print(f'{path}: {written} movies indexed, {skipped} lines without full details skipped')
+    print(f'{len(index)} movies in {args.index}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import functools
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+
+# Opt-in timing of the hot path (feed fetch and parse, TMDB lookups, merge,
+# charts, poster sections), plus bytes transferred, cache hit ratios and error
+# counts. Turn it on with LETTERBOXDBI_TRACING=1. While it's off, traced()
+# hands back the undecorated function and span() a shared no-op context, so
+# instrumented code costs next to nothing.
+TRACING_ENABLED = os.getenv('LETTERBOXDBI_TRACING', '0') == '1'
+METRIC_PREFIX = 'letterboxdbi'
+
+_NOOP = nullcontext()
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stage_calls = Counter()
+            self.stage_seconds = defaultdict(float)
+            self.stage_max = defaultdict(float)
+            self.stage_errors = Counter()
+            self.http_responses = Counter()
+            self.http_bytes = Counter()
+            self.cache_lookups = Counter()
+
+    def observe(self, stage, seconds, error=False):
+        with self._lock:
+            self.stage_calls[stage] += 1
+            self.stage_seconds[stage] += seconds
+            if seconds > self.stage_max[stage]:
+                self.stage_max[stage] = seconds
+            if error:
+                self.stage_errors[stage] += 1
+
+    def observe_http(self, host, status, size):
+        with self._lock:
+            self.http_responses[host, str(status)] += 1
+            self.http_bytes[host] += size
+
+    def observe_cache(self, cache, hit):
+        with self._lock:
+            self.cache_lookups[cache, 'hit' if hit else 'miss'] += 1
+
+    def stage_rows(self):
+        with self._lock:
+            return [
+                {
+                    'stage': stage,
+                    'calls': calls,
+                    'total_s': round(self.stage_seconds[stage], 4),
+                    'mean_ms': round(1000 * self.stage_seconds[stage] / calls, 2),
+                    'max_ms': round(1000 * self.stage_max[stage], 2),
+                    'errors': self.stage_errors[stage],
+                }
+                for stage, calls in sorted(self.stage_calls.items())
+            ]
+
+    def cache_rows(self):
+        with self._lock:
+            caches = sorted({cache for cache, _ in self.cache_lookups})
+            rows = []
+            for cache in caches:
+                hits, misses = self.cache_lookups[cache, 'hit'], self.cache_lookups[cache, 'miss']
+                rows.append({'cache': cache, 'hits': hits, 'misses': misses,
+                             'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None})
+            return rows
+
+    def prometheus_text(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} {kind}')
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+                lines.append(f'{METRIC_PREFIX}_{name}{suffix}{{{label_text}}} {value}')
+
+        with self._lock:
+            stages = sorted(self.stage_calls)
+            metric('stage_seconds', 'summary', 'Time spent in each traced stage.', [
+                sample for stage in stages for sample in (
+                    ('_sum', [('stage', stage)], repr(self.stage_seconds[stage])),
+                    ('_count', [('stage', stage)], self.stage_calls[stage]),
+                )
+            ])
+            metric('stage_seconds_max', 'gauge', 'Slowest single call of each traced stage.',
+                   [('', [('stage', stage)], repr(self.stage_max[stage])) for stage in stages])
+            metric('stage_errors_total', 'counter', 'Traced calls that raised.',
+                   [('', [('stage', stage)], self.stage_errors[stage]) for stage in stages])
+            metric('http_responses_total', 'counter', 'Outbound HTTP responses by host and status.',
+                   [('', [('host', host), ('status', status)], count)
+                    for (host, status), count in sorted(self.http_responses.items())])
+            metric('http_response_bytes_total', 'counter', 'Response body bytes received by host.',
+                   [('', [('host', host)], size) for host, size in sorted(self.http_bytes.items())])
+            metric('cache_lookups_total', 'counter', 'Cache lookups by cache and result.',
+                   [('', [('cache', cache), ('result', result)], count)
+                    for (cache, result), count in sorted(self.cache_lookups.items())])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+class _Span:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics.observe(self.stage, time.perf_counter() - self.start, error=exc_type is not None)
+        return False
+
+
+def span(stage):
+    return _Span(stage) if TRACING_ENABLED else _NOOP
+
+
+def traced(stage):
+    def decorator(func):
+        if not TRACING_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_http(host, status, size):
+    if TRACING_ENABLED:
+        metrics.observe_http(host, status, size)
+
+
+def record_cache(cache, hit):
+    if TRACING_ENABLED:
+        metrics.observe_cache(cache, hit)
@@ -1,91 +1,152 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
-import matplotlib.pyplot as plt
-import squarify
-from pypalettes import load_cmap
-from typing import List, Dict, Optional
+import io
+import json
+from app.chart_cache import aggregate_key, render_cache
+from app.tracing import traced
 
 TEXT_COLOR = '#e0edfd'
 
-def num_entries_kpi(df, year=None):
+# altair and matplotlib are imported by the functions that draw with them, so
+# importing this module for one chart doesn't load both
+
+def altair_spec_json(chart):
+    import altair as alt
+    # st.altair_chart also drops altair's default theme (fixed width/height)
+    with alt.themes.enable('none'):
+        return chart.to_json()
+
+def show_cached_altair_chart(kind, key, build_chart, **kwargs):
+    spec_json = render_cache.get_or_render(kind, key, lambda: altair_spec_json(build_chart()))
+    # streamlit pops the datasets out of the spec, so hand it a fresh dict each time
+    st.vega_lite_chart(spec=json.loads(spec_json), **kwargs)
+
+def year_over_year_delta(value, previous, previous_year):
+    # small line under a KPI comparing it with the year before
+    if previous is None:
+        return ''
+    delta = round(value - previous, 1)
+    arrow, color = ('▲', '#66dd68') if delta > 0 else ('▼', '#ef8833') if delta < 0 else ('=', TEXT_COLOR)
+    return (f"<p style='text-align: center; color: {color}; font-size: 0.8rem; margin: 0;'>"
+            f"{arrow} {abs(delta):g} vs {previous_year}</p>")
+
+@traced('chart.entries_kpi')
+def num_entries_kpi(stats, previous=None):
     
-    # st.metric(label='WATCHED', value=df.shape[0])
-    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR};'>{df.shape[0]}<br>ENTRIES</h4>")
+    # st.metric(label='WATCHED', value=stats.entries)
+    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR};'>{stats.entries}<br>ENTRIES</h4>"
+            + year_over_year_delta(stats.entries, previous and previous.entries, previous and previous.year))
     
 
-def num_hours_watched(movie_df, year=None):
+@traced('chart.hours_kpi')
+def num_hours_watched(stats, previous=None):
 
-    hours_watched = round(movie_df['runtime'].sum()/60, 1)
+    hours_watched = stats.hours_watched
     
         
     # st.metric(label='HOURS', value=hours_watched)
-    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR};'>{hours_watched}<br>HOURS</h4>")
+    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR};'>{hours_watched}<br>HOURS</h4>"
+            + year_over_year_delta(hours_watched, previous and previous.hours_watched, previous and previous.year))
 
-def num_reviews_kpi(df, year=None):
+@traced('chart.reviews_kpi')
+def num_reviews_kpi(stats, previous=None):
     
-    movies_w_reviews = df[~df['description'].str.contains('Watched on')].shape[0]
+    movies_w_reviews = stats.reviews
     # st.metric(label='REVIEWED', value=movies_w_reviews)
-    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR};'>{movies_w_reviews}<br>REVIEWS</h4>")
+    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR};'>{movies_w_reviews}<br>REVIEWS</h4>"
+            + year_over_year_delta(movies_w_reviews, previous and previous.reviews, previous and previous.year))
 
-def num_new_movies_watched_kpi(movie_data_df, year=None):
+@traced('chart.new_films_kpi')
+def num_new_movies_watched_kpi(stats, previous=None):
     
     
-    new_movies = movie_data_df[movie_data_df['release_date'].dt.year == year].shape[0]
+    new_movies = stats.new_releases
     # st.metric(label='NEW FILMS', value=new_movies)
-    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR};'>{new_movies}<br>NEW FILMS</h4>")
+    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR};'>{new_movies}<br>NEW FILMS</h4>"
+            + year_over_year_delta(new_movies, previous and previous.new_releases, previous and previous.year))
 
-def donut_chart(df, year=None):
-    genre_counts = df['genres'].explode().value_counts().reset_index()
-    dc = alt.Chart(genre_counts).mark_arc(innerRadius=50).encode(
+def pending_kpi(label):
+    # placeholder while the value still depends on TMDB data
+    st.html(f"<h4 style='text-align: center; color: {TEXT_COLOR}; opacity: 0.4;'>…<br>{label}</h4>")
+
+def build_donut_chart(genre_counts_df):
+    import altair as alt
+    return alt.Chart(genre_counts_df).mark_arc(innerRadius=50).encode(
     theta="count",
     color=alt.Color("genres:N", legend=alt.Legend(orient="bottom", columns=5)),
     )
-    
-    st.altair_chart(dc, use_container_width=True)
 
+@traced('chart.donut')
+def donut_chart(stats):
+    show_cached_altair_chart(
+        'donut', aggregate_key(stats.genre_counts),
+        lambda: build_donut_chart(stats.genre_counts.reset_index()),
+        use_container_width=True,
+    )
 
-def get_treemap_of_genres_movies_watched(movie_data_df):
-    genre_counts_df = movie_data_df['genres'].explode().value_counts().reset_index()
 
+def render_treemap_png(genre_counts_df):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import squarify
+    from pypalettes import load_cmap
     cmap = load_cmap('evergreen')
     category_codes, unique_categories = pd.factorize(genre_counts_df['genres'])
     colors = [cmap(code / (len(unique_categories) - 1)) for code in category_codes]
 
     # create a treemap
     fig, ax = plt.subplots(figsize=(9,10))
-    background_color = '#14181c'
-    fig.patch.set_facecolor(background_color)
-    
-    ax.set_axis_off()
-    squarify.plot(
-    sizes=genre_counts_df['count'],
-    label=genre_counts_df['genres'],
-    color=colors,
-    text_kwargs={'color':'white', 'fontsize': 18, 'fontfamily': 'sans-serif'},  # Increase font size and change font family
-    pad=True,
-    ax=ax
+    try:
+        background_color = '#14181c'
+        fig.patch.set_facecolor(background_color)
+        
+        ax.set_axis_off()
+        squarify.plot(
+        sizes=genre_counts_df['count'],
+        label=genre_counts_df['genres'],
+        color=colors,
+        text_kwargs={'color':'white', 'fontsize': 18, 'fontfamily': 'sans-serif'},  # Increase font size and change font family
+        pad=True,
+        ax=ax
+        )
+        
+        ax.set_title('Genres Watched', y=-0.2, fontsize=25, color=f'{TEXT_COLOR}', fontfamily='sans-serif')
+
+        # same output options st.pyplot uses
+        image = io.BytesIO()
+        fig.savefig(image, format='png', bbox_inches='tight', dpi=200)
+        return image.getvalue()
+    finally:
+        # free the figure, pyplot keeps every open figure alive otherwise
+        plt.close(fig)
+
+@traced('chart.treemap')
+def get_treemap_of_genres_movies_watched(stats):
+    png = render_cache.get_or_render(
+        'treemap', aggregate_key(stats.genre_counts),
+        lambda: render_treemap_png(stats.genre_counts.reset_index()),
     )
-    
-    ax.set_title('Genres Watched', y=-0.2, fontsize=25, color=f'{TEXT_COLOR}', fontfamily='sans-serif')
-    
-    st.pyplot(fig)
+    st.image(png, use_column_width=True)
 
 
 
 
-def bar_chart(df, year=None):
-    # value counts of memberRatings
-
-    member_rating_counts = df['memberRating'].value_counts().reset_index()
-
-
-    bc = alt.Chart(member_rating_counts).mark_bar(size=20, color= '#66dd68').encode(
+def build_bar_chart(member_rating_counts):
+    import altair as alt
+    return alt.Chart(member_rating_counts).mark_bar(size=20, color= '#66dd68').encode(
     alt.X("memberRating:Q", bin=False, title='Ratings Spread',scale=alt.Scale(domain=[0, 5.0]), axis=alt.Axis(ticks=False, labels=False, grid=False, domain=True, domainWidth=4)),
     y=alt.Y("count", axis=None),
     ).properties(title='', height = 170).configure_axisY(title=None)
-    
-    st.altair_chart(bc, use_container_width=True)
+
+@traced('chart.ratings')
+def bar_chart(stats):
+    # value counts of memberRatings
+    show_cached_altair_chart(
+        'ratings', aggregate_key(stats.rating_counts),
+        lambda: build_bar_chart(stats.rating_counts),
+        use_container_width=True,
+    )
     st.markdown(
             """
         <style>
@@ -97,81 +158,43 @@ def bar_chart(df, year=None):
             unsafe_allow_html=True,
         )
 
-def english_foreign_language_pie_chart(df):
-    # pie chart of original_language
-    original_language_counts = df['original_language'].value_counts().reset_index()
-    
-    en_count = original_language_counts[original_language_counts['original_language'] == 'en']['count'].sum()
-    non_en_count = original_language_counts[original_language_counts['original_language'] != 'en']['count'].sum()
+def build_year_over_year_chart(summary_df, selected_year):
+    import altair as alt
+    return alt.Chart(summary_df).mark_bar(size=20).encode(
+    x=alt.X('year:O', title=None, axis=alt.Axis(labelAngle=0)),
+    y=alt.Y('entries:Q', title='Films Logged'),
+    color=alt.condition(alt.datum.year == selected_year, alt.value('#66dd68'), alt.value('#475564')),
+    tooltip=['year', 'entries', 'hours', 'reviews', 'new_releases'],
+    ).properties(title=alt.TitleParams(text='Year over Year', orient='top', fontWeight='normal'), height=170)
+
+@traced('chart.year_over_year')
+def year_over_year_chart(summary_df, selected_year):
+    show_cached_altair_chart(
+        'year_over_year', aggregate_key(summary_df, selected_year),
+        lambda: build_year_over_year_chart(summary_df, selected_year),
+        use_container_width=True,
+    )
 
+def build_language_pie_chart(language_counts):
+    import altair as alt
     # Prepare data for the pie chart
     pie_data = pd.DataFrame({
-        'language': ['English', 'Foreign Language'],
-        'count': [en_count, non_en_count]
+        'language': list(language_counts.keys()),
+        'count': list(language_counts.values())
     })
 
     # Create the pie chart without a legend
-    pie_chart = alt.Chart(pie_data, title=alt.TitleParams(text='International Films', orient='top', fontWeight='normal')).mark_arc().encode(
+    return alt.Chart(pie_data, title=alt.TitleParams(text='International Films', orient='top', fontWeight='normal')).mark_arc().encode(
         theta=alt.Theta(field='count', type='quantitative'),
         color=alt.Color(field='language', type='nominal', scale=alt.Scale(range=['#475564','#66dd68']), legend=None),
         tooltip=['language', 'count']
     ).properties(height=170)
 
-    st.altair_chart(pie_chart, theme=None, use_container_width=True)    
-
-
-
-def rating_to_stars(rating):
-    rating = float(rating)
-    stars = '⭐️' * int(rating)
-    return stars
-
-
-
-def create_movie_thumbnails(movie_df: pd.DataFrame, caption: Optional[str] = None) -> List[Dict[str, str]]:
-    records = movie_df[['title', 'memberRating', 'poster_url']].to_dict(orient='records')
-    return [
-        {
-            'image': record['poster_url'],
-            'caption': caption if caption in ['First Film', 'Last Film'] else rating_to_stars(record['memberRating']),
-            'title': record['title']
-        }
-        for record in records
-    ]
-
-def get_top3_movies(movie_df: pd.DataFrame) -> List[Dict[str, str]]:
-    top3 = movie_df.nlargest(3, 'memberRating')
-    return create_movie_thumbnails(top3)
-
-def most_recent_log(movie_df: pd.DataFrame) -> List[Dict[str, str]]:
-    most_recent = movie_df.nlargest(1, 'logDate')
-    return create_movie_thumbnails(most_recent, caption='Last Film')
-
-def first_log(movie_df: pd.DataFrame) -> List[Dict[str, str]]:
-    first_log = movie_df.nsmallest(1, 'logDate')
-    return create_movie_thumbnails(first_log, caption='First Film')
-
-
-def vibe_calculator(movie_df):
-    
-    
-    # Calculate the number of films watched in each genre
-    # nostalgia merchant = films watched that were released before 2000
-
-    nostalgia_merchant = movie_df[movie_df['release_date'].dt.year < 2000].shape[0]
-
-    # cinema lover = films watched that were released in the current year
-    current_year = pd.Timestamp.now().year
-    cinema_lover = movie_df[movie_df['release_date'].dt.year == current_year].shape[0]
-
-    # globe trotter = films watched that are not in English
-    globe_trotter = movie_df[movie_df['original_language'] != 'en'].shape[0]
-
-    vibes = {
-        'Old Soul': nostalgia_merchant,
-        'Popcorn Enjoyer': cinema_lover,
-        'Globe Trotter': globe_trotter
-    }
-
-    max_vibe = max(vibes, key=vibes.get)
-    return max_vibe
+@traced('chart.languages')
+def english_foreign_language_pie_chart(stats):
+    # pie chart of original_language
+    show_cached_altair_chart(
+        'languages', aggregate_key(stats.language_counts),
+        lambda: build_language_pie_chart(stats.language_counts),
+        theme=None, use_container_width=True,
+    )
@@ -0,0 +1,60 @@
+import importlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# The form page renders without pandas, altair, matplotlib, PIL or the feed
+# parser. Once it's out, warm_up() imports them on a background thread so the
+# first submit in a fresh worker usually finds them loaded already. A session
+# that submits before warm-up is done just imports what it needs itself.
+# LETTERBOXDBI_WARMUP=0 turns it off.
+WARMUP_ENABLED = os.getenv('LETTERBOXDBI_WARMUP', '1') != '0'
+# in the order a submit needs them: the diary load first, then charts and poster
+WARMUP_MODULES = [
+    'app.prefetch',
+    'app.visualisations',
+    'altair',
+    'matplotlib.pyplot',
+    'squarify',
+    'pypalettes',
+    'app.poster_generator',
+]
+
+_thread = None
+_lock = threading.Lock()
+
+
+def warm_up():
+    from app.fonts import preload_fonts
+
+    start = time.perf_counter()
+    for name in WARMUP_MODULES:
+        if name == 'matplotlib.pyplot':
+            # same backend the treemap selects, before pyplot picks one itself
+            importlib.import_module('matplotlib').use('Agg')
+        importlib.import_module(name)
+    preload_fonts()
+    logger.info('Warm-up finished in %.2fs', time.perf_counter() - start)
+
+
+def _warm_up_quietly():
+    try:
+        warm_up()
+    except Exception:
+        # a failure here shows up again, with context, on the code path that needs the module
+        logger.exception('Warm-up failed')
+
+
+def start_warmup():
+    # once per process; reruns and other sessions find the thread already started
+    global _thread
+    if not WARMUP_ENABLED:
+        return None
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_warm_up_quietly, name='warmup', daemon=True)
+            _thread.start()
+    return _thread
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Cold start of the Streamlit app: a fresh interpreter per run, timed until
+# the first script run has rendered the username form.
+#   python -m benchmarks.bench_cold_start
+#   python -m benchmarks.bench_cold_start --eager    # import everything up front, as main.py used to
+#   python -m benchmarks.bench_cold_start --profile  # import-time profile of main.py
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['pandas', 'numpy', 'altair', 'matplotlib', 'PIL', 'pyarrow', 'requests']
+EAGER_MODULES = ['app.prefetch', 'app.visualisations', 'altair', 'matplotlib.pyplot', 'squarify', 'pypalettes',
+                 'app.poster_generator', 'app.fonts']
+
+CHILD = """
+import importlib, json, sys, time
+from streamlit.testing.v1 import AppTest
+streamlit_loaded = time.time()
+for name in {eager!r}:
+    importlib.import_module(name)
+at = AppTest.from_file('main.py', default_timeout=60)
+at.run()
+form = time.time()
+assert len(at.text_input) == 1 and not at.exception, at.exception
+loaded = [name for name in {heavy!r} if name in sys.modules]
+warmup_s = None
+from app import warmup
+if warmup._thread is not None:
+    warmup._thread.join()
+    warmup_s = time.time() - form
+print(json.dumps({{'streamlit_loaded': streamlit_loaded, 'form': form, 'loaded': loaded, 'warmup_s': warmup_s}}))
+"""
+
+
+def cold_start(eager):
+    code = CHILD.format(eager=EAGER_MODULES if eager else [], heavy=HEAVY_MODULES)
+    start = time.time()
+    output = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, check=True, capture_output=True,
+                            text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return {
+        'to_form_s': result['form'] - start,
+        # AppTest has to import streamlit before it can run anything, time the app part on its own
+        'app_s': result['form'] - result['streamlit_loaded'],
+        'loaded': result['loaded'],
+        'warmup_s': result['warmup_s'],
+    }
+
+
+def import_profile(top):
+    # python -X importtime of main.py, every module it pulls in, slowest first
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=BASE_DIR, check=True,
+                            capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '').split('|')]
+        rows.append((int(cumulative_us), int(self_us), name))
+    print(f'{"cumulative ms":>14} {"self ms":>8}  module')
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f'{cumulative_us / 1e3:>14.1f} {self_us / 1e3:>8.1f}  {name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time from a fresh interpreter to the rendered username form')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--eager', action='store_true', help='import the heavy modules before the first run')
+    parser.add_argument('--profile', action='store_true', help='print an import-time profile of main.py instead')
+    parser.add_argument('--top', type=int, default=25, help='modules shown by --profile')
+    args = parser.parse_args()
+
+    if args.profile:
+        import_profile(args.top)
+        return
+
+    runs = [cold_start(args.eager) for _ in range(args.runs)]
+    to_form = statistics.median(run['to_form_s'] for run in runs)
+    app = statistics.median(run['app_s'] for run in runs)
+    print(f'{"eager" if args.eager else "lazy"} imports, median of {args.runs} runs:')
+    print(f'  process start to rendered form: {to_form:.3f}s ({app:.3f}s after streamlit is imported)')
+    print(f'  heavy modules loaded by then:   {", ".join(runs[-1]["loaded"]) or "none"}')
+    warmups = [run['warmup_s'] for run in runs if run['warmup_s'] is not None]
+    if warmups:
+        print(f'  background warm-up after form:  {statistics.median(warmups):.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import io
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+from PIL import ImageFont
+
+from app.fonts import FONT_SIZES, FONT_URLS, font_path
+
+COLD_START = """
+import time
+start = time.perf_counter()
+from app.fonts import load_fonts
+imported = time.perf_counter()
+load_fonts()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def cold_start_seconds():
+    # a fresh interpreter each time, so nothing is warm but the OS page cache
+    output = subprocess.run([sys.executable, '-c', COLD_START], check=True, capture_output=True, text=True).stdout
+    import_seconds, load_seconds = output.strip().splitlines()[-1].split()
+    return float(import_seconds), float(load_seconds)
+
+
+def load_from_bytes():
+    # the old path: one in-memory copy of the file per sized font
+    fonts = {}
+    for key, (filename, size) in FONT_SIZES.items():
+        with open(font_path(filename), 'rb') as f:
+            fonts[key] = ImageFont.truetype(io.BytesIO(f.read()), size)
+    return fonts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup cost of loading the poster fonts')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    missing = []
+    for filename in FONT_URLS:
+        try:
+            font_path(filename)
+        except (OSError, requests.RequestException):
+            missing.append(filename)
+    if missing:
+        sys.exit(f'fonts not available: {", ".join(missing)}; vendor them with python -m app.fonts')
+
+    cold = [cold_start_seconds() for _ in range(args.repeat)]
+    imports = [import_seconds for import_seconds, _ in cold]
+    loads = [load_seconds for _, load_seconds in cold]
+    print(f'cold start: import median {statistics.median(imports) * 1e3:.1f} ms, '
+          f'load_fonts median {statistics.median(loads) * 1e3:.1f} ms (max {max(loads) * 1e3:.1f} ms)')
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        load_from_bytes()
+        timings.append(time.perf_counter() - start)
+    print(f'load from in-memory bytes (previous behaviour, excluding download): median {statistics.median(timings) * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# keep the benchmark's spill files away from the real ones
+os.environ.setdefault('LETTERBOXDBI_CACHE_DIR', tempfile.mkdtemp(prefix='letterboxdbi-bench-'))
+
+from app.frame_cache import FrameCache, FRAME_DIR, frame_bytes
+from app.schema import build_movie_frame
+from benchmarks.fixtures import synthetic_merged_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frame cache memory bound and lookup latency per tier')
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--entries', type=int, default=1000, help='diary entries per user')
+    parser.add_argument('--max-mib', type=float, default=16, help='in-memory budget')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    diaries = [build_movie_frame(synthetic_merged_frame(args.entries, year=2024, seed=seed)) for seed in range(20)]
+    cache = FrameCache(FRAME_DIR, max_bytes=int(args.max_mib * 1024 * 1024))
+    start = time.perf_counter()
+    for i in range(args.users):
+        cache.put(f'user{i}', diaries[i % len(diaries)])
+    fill_seconds = time.perf_counter() - start
+
+    # a few users come back far more often than the rest
+    rng = random.Random(args.seed)
+    weights = [1 / (rank + 1) for rank in range(args.users)]
+    latencies = {'memory': [], 'disk': [], 'miss': []}
+    for key in rng.choices([f'user{i}' for i in range(args.users)], weights, k=args.requests):
+        before = dict(cache.counts)
+        start = time.perf_counter()
+        cache.get(key)
+        elapsed = time.perf_counter() - start
+        tier = ('memory' if cache.counts['memory_hits'] > before.get('memory_hits', 0)
+                else 'disk' if cache.counts['disk_hits'] > before.get('disk_hits', 0) else 'miss')
+        latencies[tier].append(elapsed)
+
+    stats = cache.stats()
+    spilled = sum(os.path.getsize(os.path.join(root, name))
+                  for root, _, names in os.walk(FRAME_DIR) for name in names)
+    one_frame = frame_bytes(diaries[0])
+    print(f'{args.users} users x {args.entries} entries, {one_frame / 2**20:.2f} MiB per frame in memory, '
+          f'{args.users * one_frame / 2**20:.0f} MiB unbounded')
+    print(f'memory held {stats["bytes"] / 2**20:.1f} MiB of {args.max_mib:g} MiB ({stats["entries"]} frames), '
+          f'{spilled / 2**20:.1f} MiB spilled to parquet; filling took {fill_seconds:.2f}s')
+    for tier, values in latencies.items():
+        if values:
+            print(f'{tier:<6} {len(values):>6} lookups, median {statistics.median(values) * 1e3:8.3f} ms')
+    print({name: value for name, value in stats.items() if name not in ('bytes', 'entries')})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import time
+
+import pandas as pd
+
+from app.personas import get_model
+from app.schema import build_movie_frame
+from benchmarks.fixtures import synthetic_merged_frame
+
+
+def legacy_vibe(movie_df, year):
+    # the old vibe_calculator: three separate filters, three personas
+    vibes = {
+        'Old Soul': movie_df[movie_df['release_date'].dt.year < 2000].shape[0],
+        'Popcorn Enjoyer': movie_df[movie_df['release_date'].dt.year == year].shape[0],
+        'Globe Trotter': movie_df[movie_df['original_language'] != 'en'].shape[0],
+    }
+    return max(vibes, key=vibes.get)
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Persona scoring throughput for batches of users')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--entries', type=int, default=150, help='diary entries per user')
+    parser.add_argument('--distinct', type=int, default=40, help='distinct synthetic diaries to cycle through')
+    parser.add_argument('--year', type=int, default=2024)
+    args = parser.parse_args()
+
+    diaries = [build_movie_frame(synthetic_merged_frame(args.entries, year=args.year, seed=seed))
+               for seed in range(args.distinct)]
+    frames = [diaries[i % args.distinct] for i in range(args.users)]
+    model = get_model()
+
+    legacy = timed(lambda: [legacy_vibe(df, args.year) for df in frames])
+    # the batch pipeline scores each user as their feed arrives, one frame at a time
+    scores = []
+    engine = timed(lambda: scores.extend(model.score(df, args.year) for df in frames))
+
+    print(f'{args.users} users x {args.entries} entries, {len(model.names)} personas ({len(model.features)} features)')
+    print(f'legacy vibe_calculator, 3 personas: {args.users / legacy:9.0f} users/s')
+    print(f'persona engine, all personas:       {args.users / engine:9.0f} users/s')
+    print(pd.Series([user_scores.idxmax() for user_scores in scores]).value_counts().to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import io
+import os
+import tempfile
+import time
+
+# keep the benchmark's thumbnail and story caches away from the real ones
+os.environ.setdefault('LETTERBOXDBI_CACHE_DIR', tempfile.mkdtemp(prefix='letterboxdbi-bench-'))
+
+from app import poster_generator
+from app.poster_output import ENCODERS, encode_poster
+from app.schema import build_movie_frame
+from app.stats import YearInFilmStats
+from benchmarks.bench_poster_render import check_fonts, seed_thumbnails
+from benchmarks.fixtures import synthetic_merged_frame
+
+
+def best_ms(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Encode time and size of the story poster per encoder')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--qualities', type=int, nargs='+', default=[75, 85, 95, 100], help='for webp and jpeg')
+    parser.add_argument('--year', type=int, default=2024)
+    args = parser.parse_args()
+
+    movie_df = build_movie_frame(synthetic_merged_frame(200, year=args.year))
+    stats = YearInFilmStats.from_frame(movie_df, args.year)
+    seed_thumbnails(stats.top3)
+    fonts_loaded = check_fonts()
+    image, _ = poster_generator.render_poster('bench', args.year, stats.top3, stats)
+
+    def plain_png():
+        # what create_poster used to write: PIL's default PNG settings
+        f = io.BytesIO()
+        image.save(f, format='PNG')
+        return f
+    plain_size = len(plain_png().getvalue())
+    print(f'{"encoder":<14} {"encode ms":>10} {"KiB":>8}')
+    print(f'{"plain png":<14} {best_ms(plain_png, args.repeat):>10.1f} {plain_size / 1024:>8.1f}')
+    for fmt in ENCODERS:
+        for quality in args.qualities if fmt in ('webp', 'jpeg') else [None]:
+            size = len(encode_poster(image, fmt, quality))
+            ms = best_ms(lambda: encode_poster(image, fmt, quality), args.repeat)
+            label = fmt if quality is None else f'{fmt} q{quality}'
+            print(f'{label:<14} {ms:>10.1f} {size / 1024:>8.1f}')
+
+    def story(fmt):
+        return poster_generator.create_poster('bench', movie_df, args.year, stats.top3, stats=stats, fmt=fmt)
+    if not fonts_loaded:
+        print('story cache skipped: stories drawn with stand-in fonts are never cached')
+        return
+    for fmt in ENCODERS:
+        story(fmt)
+        print(f'{fmt:<5} repeat render served from the story cache: {best_ms(lambda: story(fmt), args.repeat):.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
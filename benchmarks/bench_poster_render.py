@@ -0,0 +1,72 @@
+import argparse
+import os
+import tempfile
+import time
+
+# keep the benchmark's thumbnail cache away from the real one
+os.environ.setdefault('LETTERBOXDBI_CACHE_DIR', tempfile.mkdtemp(prefix='letterboxdbi-bench-'))
+
+from PIL import Image
+
+from app import poster_generator
+from app.fonts import all_fonts_loaded, load_fonts
+from app.poster_assets import rounded_mask, thumbnail_path
+from app.schema import build_movie_frame
+from app.stats import YearInFilmStats
+from benchmarks.fixtures import synthetic_merged_frame
+
+
+def seed_thumbnails(top3):
+    # warm the on-disk thumbnail cache so the benchmark measures rendering only
+    for movie in top3:
+        path = thumbnail_path(movie['image'], poster_generator.poster_size, poster_generator.poster_radius)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        poster = Image.linear_gradient('L').resize(poster_generator.poster_size).convert('RGBA')
+        poster.putalpha(rounded_mask(poster_generator.poster_size, poster_generator.poster_radius))
+        poster.save(path, format='PNG')
+
+
+def check_fonts():
+    # without the real fonts posters still render, with Pillow's default font instead
+    load_fonts()
+    if not all_fonts_loaded():
+        print('poster fonts not found, drawing with the default font (python -m app.fonts vendors them)')
+    return all_fonts_loaded()
+
+
+def posters_per_second(render, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        render()
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Story posters rendered per second on one core')
+    parser.add_argument('--posters', type=int, default=30)
+    parser.add_argument('--year', type=int, default=2024)
+    args = parser.parse_args()
+
+    movie_df = build_movie_frame(synthetic_merged_frame(200, year=args.year))
+    stats = YearInFilmStats.from_frame(movie_df, args.year)
+    seed_thumbnails(stats.top3)
+    check_fonts()
+
+    def cold_template():
+        poster_generator.base_template.cache_clear()
+        poster_generator.render_poster('bench', args.year, stats.top3, stats)
+
+    def warm_template():
+        poster_generator.render_poster('bench', args.year, stats.top3, stats)
+
+    def warm_with_png():
+        poster_generator.create_poster('bench', movie_df, args.year, stats.top3, stats=stats, cache=False)
+
+    warm_template()
+    print(f'template rebuilt every poster: {posters_per_second(cold_template, args.posters):7.1f} posters/s/core')
+    print(f'cached template:               {posters_per_second(warm_template, args.posters):7.1f} posters/s/core')
+    print(f'cached template + PNG encode:  {posters_per_second(warm_with_png, args.posters):7.1f} posters/s/core')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import io
+import time
+import xml.etree.ElementTree as ET
+
+from app.movie_data import iter_rss_items, parse_movie_data
+from benchmarks.fixtures import synthetic_rss_feed
+
+
+def soup_parse(feed):
+    root = ET.fromstring(feed)
+    return [parse_movie_data(item) for item in root.findall('.//item')]
+
+
+def streaming_parse(feed):
+    return list(iter_rss_items(io.BytesIO(feed)))
+
+
+def time_per_item(parse, feed, n_items, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(feed)
+        best = min(best, time.perf_counter() - start)
+    return best / n_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-item cost of the RSS parsers')
+    parser.add_argument('--items', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'soup us/item':>14} {'streaming us/item':>18} {'speedup':>8}")
+    for n in args.items:
+        feed = synthetic_rss_feed(n)
+        assert soup_parse(feed) == streaming_parse(feed)
+        soup = time_per_item(soup_parse, feed, n, args.repeat)
+        streaming = time_per_item(streaming_parse, feed, n, args.repeat)
+        print(f'{n:>8} {soup * 1e6:>14.1f} {streaming * 1e6:>18.1f} {soup / streaming:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
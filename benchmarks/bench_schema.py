@@ -0,0 +1,55 @@
+import argparse
+import time
+
+from app.schema import build_movie_frame, genre_counts
+from benchmarks.fixtures import synthetic_merged_frame
+
+
+def legacy_aggregates(df, year):
+    return (
+        df['genres'].explode().value_counts(),
+        df['original_language'].value_counts(),
+        df[~df['description'].str.contains('Watched on')].shape[0],
+        df[df['release_date'].dt.year == year].shape[0],
+        df['runtime'].sum(),
+    )
+
+
+def typed_aggregates(df, year):
+    return (
+        genre_counts(df),
+        df['original_language'].value_counts(),
+        df[~df['description'].str.contains('Watched on')].shape[0],
+        df[df['release_date'].dt.year == year].shape[0],
+        df['runtime'].sum(),
+    )
+
+
+def best_time(func, *args, repeat=7):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory and aggregation speed of the untyped vs typed movie frame')
+    parser.add_argument('--entries', type=int, nargs='+', default=[50, 1000, 10000])
+    parser.add_argument('--year', type=int, default=2024)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'legacy KiB':>11} {'typed KiB':>10} {'legacy ms':>10} {'typed ms':>9}")
+    for n in args.entries:
+        legacy_df = synthetic_merged_frame(n, year=args.year)
+        typed_df = build_movie_frame(legacy_df)
+        legacy_kib = legacy_df.memory_usage(deep=True).sum() / 1024
+        typed_kib = typed_df.memory_usage(deep=True).sum() / 1024
+        legacy_ms = best_time(legacy_aggregates, legacy_df, args.year) * 1e3
+        typed_ms = best_time(typed_aggregates, typed_df, args.year) * 1e3
+        print(f'{n:>8} {legacy_kib:>11.1f} {typed_kib:>10.1f} {legacy_ms:>10.2f} {typed_ms:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
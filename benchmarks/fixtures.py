@@ -0,0 +1,131 @@
+import random
+
+# Synthetic Letterboxd data shaped like the real RSS feed, for benchmarks
+
+RSS_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<rss version="2.0" xmlns:letterboxd="https://letterboxd.com" xmlns:tmdb="https://themoviedb.org">'
+    '<channel><title>Letterboxd - {username}</title>'
+)
+RSS_FOOTER = '</channel></rss>'
+
+ITEM_TEMPLATE = """<item>
+<title>{title}, {release_year} - {stars}</title>
+<link>https://letterboxd.com/{username}/film/film-{tmdb_id}/</link>
+<guid isPermaLink="false">letterboxd-review-{guid}</guid>
+<pubDate>Mon, 01 Jan {year} 12:00:00 +1300</pubDate>
+<letterboxd:watchedDate>{watched_date}</letterboxd:watchedDate>
+<letterboxd:rewatch>{rewatch}</letterboxd:rewatch>
+<letterboxd:filmTitle>{title}</letterboxd:filmTitle>
+<letterboxd:filmYear>{release_year}</letterboxd:filmYear>
+<letterboxd:memberRating>{rating}</letterboxd:memberRating>
+<tmdb:{id_tag}>{tmdb_id}</tmdb:{id_tag}>
+<description><![CDATA[ <p><img src="https://a.ltrbxd.com/resized/film-poster/{tmdb_id}-0-600-0-900-crop.jpg"/></p> <p>{review}</p> ]]></description>
+<dc:creator xmlns:dc="http://purl.org/dc/elements/1.1/">{username}</dc:creator>
+</item>"""
+
+REVIEWS = [
+    'Watched on Monday January 1, {year}.',
+    'An absolute &lt;i&gt;masterpiece&lt;/i&gt; &amp; I will be thinking about it for weeks.',
+    'Not for me, but I can see why people love it. The score alone is worth the watch.',
+]
+
+
+def synthetic_entries(n, year=2024, seed=0, catalogue_size=None, tv_every=0):
+    # tv_every=N makes every Nth entry a TV show (tmdb:tvId instead of tmdb:movieId)
+    rng = random.Random(seed)
+    catalogue_size = catalogue_size or max(10, n // 2)
+    for i in range(n):
+        tmdb_id = 100 + rng.randrange(catalogue_size)
+        yield {
+            'guid': i,
+            'tmdb_id': tmdb_id,
+            'title': f'Film {tmdb_id}',
+            'release_year': 1950 + tmdb_id % 75,
+            'watched_date': f'{year}-{1 + i % 12:02d}-{1 + i % 28:02d}',
+            'rating': rng.choice([0.5, 1.0, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]),
+            'review': REVIEWS[rng.randrange(len(REVIEWS))].format(year=year),
+            'year': year,
+            'rewatch': 'Yes' if i % 9 == 4 else 'No',
+            'id_tag': 'tvId' if tv_every and i % tv_every == tv_every - 1 else 'movieId',
+        }
+
+
+def synthetic_rss_feed(n, username='bench', year=2024, seed=0, tv_every=0):
+    items = []
+    for entry in synthetic_entries(n, year, seed, tv_every=tv_every):
+        stars = '★' * int(entry['rating'])
+        items.append(ITEM_TEMPLATE.format(username=username, stars=stars, **entry))
+    return (RSS_HEADER.format(username=username) + ''.join(items) + RSS_FOOTER).encode('utf-8')
+
+
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
+    'Fantasy', 'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction',
+    'TV Movie', 'Thriller', 'War', 'Western',
+]
+LANGUAGES = ['en', 'en', 'en', 'fr', 'ja', 'ko', 'es', 'de', 'it', 'hi']
+
+
+def synthetic_tmdb_movie(tmdb_id):
+    # the subset of a /3/movie/{id} response the app reads
+    rng = random.Random(tmdb_id)
+    return {
+        'id': tmdb_id,
+        'original_title': f'Film {tmdb_id}',
+        'runtime': rng.randint(75, 180),
+        'genres': [{'id': i, 'name': name} for i, name in enumerate(rng.sample(GENRES, rng.randint(1, 3)))],
+        'release_date': f'{1950 + tmdb_id % 75}-{1 + tmdb_id % 12:02d}-15',
+        'original_language': rng.choice(LANGUAGES),
+        'poster_path': f'/poster{tmdb_id}.jpg',
+    }
+
+
+def synthetic_tmdb_tv(tmdb_id):
+    # the subset of a /3/tv/{id} response the app reads
+    movie = synthetic_tmdb_movie(tmdb_id)
+    return {
+        'id': tmdb_id,
+        'original_name': f'Show {tmdb_id}',
+        'episode_run_time': [movie['runtime'] // 3],
+        'genres': movie['genres'],
+        'first_air_date': movie['release_date'],
+        'original_language': movie['original_language'],
+        'poster_path': f'/poster{tmdb_id}.jpg',
+    }
+
+
+SYNTHETIC_TMDB = {'movie': synthetic_tmdb_movie, 'tv': synthetic_tmdb_tv}
+
+
+def synthetic_merged_frame(n, year=2024, seed=0):
+    # the untyped frame get_movie_data_from_rss_feed used to return, built offline
+    import io
+    from app.movie_data import (
+        TMDB_RECORDS, build_letterboxd_frame, build_tmdb_frame, iter_rss_items, merge_tmdb_data, tmdb_keys,
+    )
+    letterboxd_df = build_letterboxd_frame(list(iter_rss_items(io.BytesIO(synthetic_rss_feed(n, year=year, seed=seed)))))
+    tmdb_df = build_tmdb_frame([
+        {**TMDB_RECORDS[media_type](tmdb_id, SYNTHETIC_TMDB[media_type](int(tmdb_id))), 'media_type': media_type}
+        for tmdb_id, media_type in tmdb_keys(letterboxd_df)
+    ])
+    return merge_tmdb_data(letterboxd_df, tmdb_df)
+
+
+def synthetic_diary_csv(path, n, years=(2022, 2023, 2024), seed=0):
+    # diary.csv in the Letterboxd export layout, oldest entry first
+    import csv
+    rng = random.Random(seed)
+    per_year = n // len(years)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Name', 'Year', 'Letterboxd URI', 'Rating', 'Rewatch', 'Tags', 'Watched Date'])
+        i = 0
+        for year in years:
+            for j in range(per_year):
+                tmdb_id = 100 + rng.randrange(max(10, n // 2))
+                watched = f'{year}-{1 + j * 12 // per_year:02d}-{1 + j % 28:02d}'
+                rating = rng.choice(['', '2', '3', '3.5', '4', '4.5', '5'])
+                writer.writerow([watched, f'Film {tmdb_id}', 1950 + tmdb_id % 75,
+                                 f'https://boxd.it/entry{i}', rating, '', '', watched])
+                i += 1
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_server import StubServer
+
+# Concurrent-session load test against the local stub server:
+#   python -m benchmarks.load_test --concurrency 1 4 16 64 --sessions 200
+# Each concurrency level runs in a fresh process with an empty cache directory.
+# Simulated sessions go through the same functions as dashboard.main, on
+# threads as Streamlit runs them. "story" sessions wait for the diary load and
+# then call generate_story. "dashboard" sessions call
+# display_dashboard_progressively, partial view and all. Streamlit calls run
+# without a browser attached, so protos are built but not sent. Sessions pick
+# among --users usernames, so repeat visits exercise the caches and request
+# coalescing the way returning users do. Throughput stops growing and p95
+# climbs at the saturation point.
+
+YEAR = 2024
+FLOWS = ['story', 'dashboard']
+
+
+def percentile(values, p):
+    # nearest rank
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def latency_summary(values):
+    return {
+        'sessions': len(values),
+        'p50_s': percentile(values, 50),
+        'p95_s': percentile(values, 95),
+        'p99_s': percentile(values, 99),
+        'max_s': max(values) if values else None,
+    }
+
+
+def run_level(concurrency, sessions, users, story_share, year, seed):
+    # runs in the worker process, after the stub URLs and cache dir are in the environment
+    from streamlit import logger as streamlit_logger
+    # every call outside `streamlit run` warns about the missing script context
+    streamlit_logger.set_log_level('error')
+
+    from app.dashboard import display_dashboard_progressively, generate_story
+    from app.frame_cache import frame_cache
+    from app.movie_data import tmdb_requests
+    from app.poster_assets import poster_requests
+    from app.prefetch import start_prefetch
+
+    def story(username):
+        job = start_prefetch(username, year).wait()
+        stats = job.year_stats(year)
+        generate_story(username, job.year_frame(year), year, stats.top3, stats)
+
+    def dashboard(username):
+        display_dashboard_progressively(username, year, start_prefetch(username, year))
+
+    rng = random.Random(seed)
+    plan = [('story' if rng.random() < story_share else 'dashboard', f'user{rng.randrange(users)}')
+            for _ in range(sessions)]
+    flows = {'story': story, 'dashboard': dashboard}
+
+    def session(flow, username):
+        start = time.perf_counter()
+        try:
+            flows[flow](username)
+            error = None
+        except Exception as e:
+            error = repr(e)
+        return flow, time.perf_counter() - start, error
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda args: session(*args), plan))
+    elapsed = time.perf_counter() - start
+
+    latencies = {flow: [seconds for result_flow, seconds, error in results if result_flow == flow and error is None]
+                 for flow in FLOWS}
+    errors = [error for _, _, error in results if error is not None]
+    return {
+        'concurrency': concurrency,
+        'sessions': sessions,
+        'elapsed_s': elapsed,
+        'sessions_per_s': sessions / elapsed,
+        'all': latency_summary(latencies['story'] + latencies['dashboard']),
+        **{flow: latency_summary(latencies[flow]) for flow in FLOWS},
+        'errors': len(errors),
+        'first_errors': errors[:3],
+        'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'coalesced': {'tmdb': tmdb_requests.shared, 'poster': poster_requests.shared},
+        'frame_cache': frame_cache.stats(),
+    }
+
+
+def spawn_level(server, concurrency, args):
+    with tempfile.TemporaryDirectory(prefix='letterboxdbi-load-') as cache_dir:
+        # never reach for the network: without vendored fonts stories use Pillow's default font
+        env = dict(os.environ, **server.env(), LETTERBOXDBI_CACHE_DIR=cache_dir, LETTERBOXDBI_TRACING='0',
+                   FONT_DOWNLOAD='0')
+        before = dict(server.state.counts)
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.load_test', '--worker', '--concurrency', str(concurrency),
+             '--sessions', str(args.sessions), '--users', str(args.users), '--story-share', str(args.story_share),
+             '--year', str(args.year), '--seed', str(args.seed)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['upstream_requests'] = {
+        route: count - before.get(route, 0) for route, count in server.state.counts.items()
+        if count - before.get(route, 0)
+    }
+    return result
+
+
+def ms(seconds):
+    return '-' if seconds is None else f'{seconds * 1e3:.0f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent story and dashboard sessions against a local stub')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help='simultaneous sessions, one run per value')
+    parser.add_argument('--sessions', type=int, default=200, help='sessions per run')
+    parser.add_argument('--users', type=int, default=50, help='distinct usernames the sessions pick from')
+    parser.add_argument('--story-share', type=float, default=0.7, help='fraction of sessions that generate a story')
+    parser.add_argument('--entries', type=int, default=100, help='diary entries per user')
+    parser.add_argument('--latency-ms', type=float, default=50, help='delay the stub adds to every upstream response')
+    parser.add_argument('--year', type=int, default=YEAR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the results here as JSON')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_level(args.concurrency[0], args.sessions, args.users, args.story_share, args.year,
+                                   args.seed)))
+        return
+
+    results = []
+    with StubServer(year=args.year, entries=args.entries, latency=args.latency_ms / 1000) as server:
+        print(f'{args.sessions} sessions per run over {args.users} users, {args.story_share:.0%} stories, '
+              f'{args.entries} entries each, {args.latency_ms:g} ms upstream latency')
+        print(f'{"conc":>5} {"sess/s":>7} {"p50 ms":>7} {"p95 ms":>7} {"p99 ms":>7} {"story p95":>9} '
+              f'{"dash p95":>9} {"errors":>6} {"RSS MiB":>8}  upstream (coalesced)')
+        for concurrency in args.concurrency:
+            result = spawn_level(server, concurrency, args)
+            results.append(result)
+            upstream = ', '.join(f'{route} {count}' for route, count in sorted(result['upstream_requests'].items()))
+            coalesced = ', '.join(f'{name} {count}' for name, count in result['coalesced'].items())
+            print(f"{concurrency:>5} {result['sessions_per_s']:>7.1f} {ms(result['all']['p50_s']):>7} "
+                  f"{ms(result['all']['p95_s']):>7} {ms(result['all']['p99_s']):>7} "
+                  f"{ms(result['story']['p95_s']):>9} {ms(result['dashboard']['p95_s']):>9} "
+                  f"{result['errors']:>6} {result['peak_rss_mib']:>8}  {upstream} ({coalesced})")
+            for error in result['first_errors']:
+                print(f'      {error}')
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k not in ('worker', 'out')}, 'runs': results},
+                      f, indent=2)
+        print(f'wrote {args.out}')
+
+
+if __name__ == '__main__':
+    main()
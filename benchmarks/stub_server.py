@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+from benchmarks.fixtures import SYNTHETIC_TMDB, synthetic_rss_feed
+
+# Local stand-in for Letterboxd RSS, the TMDB API and the TMDB image host.
+#   /{username}/rss/             synthetic feed; "name-250" gets 250 entries
+#   /3/movie/{id}, /3/tv/{id}    TMDB movie and TV details
+#   /3/search/movie?query=...    TMDB search, resolves the synthetic "Film {id}" titles
+#   /t/p/{size}/poster{id}.jpg   poster JPEG at the requested width
+# Point the app at it with LETTERBOXD_URL=<url>, TMDB_API_URL=<url>/3 and
+# TMDB_IMAGE_URL=<url>/t/p.
+
+FEED_PATH = re.compile(r'^/([^/]+)/rss/?$')
+MOVIE_PATH = re.compile(r'^/3/(movie|tv)/(\d+)')
+SEARCH_PATH = '/3/search/movie'
+SYNTHETIC_TITLE = re.compile(r'Film (\d+)')
+POSTER_PATH = re.compile(r'^/t/p/(w\d+|original)/poster(\d+)\.jpg$')
+ENTRIES_SUFFIX = re.compile(r'-(\d+)$')
+
+
+class StubState:
+    def __init__(self, entries=50, year=2024, throttle_every=0, tv_every=0, fail_ids=(), latency=0.0):
+        self.entries = entries
+        self.year = year
+        self.throttle_every = throttle_every
+        self.tv_every = tv_every
+        # TMDB ids answered with a 500, to exercise per-item failures
+        self.fail_ids = set(fail_ids)
+        # seconds added to every response, to stand in for the round trip to the real hosts
+        self.latency = latency
+        self.counts = Counter()
+        # requests being answered right now, and the most there have been at once
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self._feeds = {}
+        self._posters = {}
+
+    def count(self, route):
+        with self.lock:
+            self.counts[route] += 1
+            return self.counts[route]
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def feed(self, username):
+        match = ENTRIES_SUFFIX.search(username)
+        entries = int(match.group(1)) if match else self.entries
+        if username not in self._feeds:
+            seed = zlib.crc32(username.encode())
+            self._feeds[username] = synthetic_rss_feed(entries, username=username, year=self.year, seed=seed,
+                                                       tv_every=self.tv_every)
+        return self._feeds[username]
+
+    def poster(self, size):
+        if size not in self._posters:
+            poster_width = 2000 if size == 'original' else int(size[1:])
+            poster = Image.linear_gradient('L').resize((poster_width, poster_width * 3 // 2)).convert('RGB')
+            buffer = io.BytesIO()
+            poster.save(buffer, format='JPEG', quality=85)
+            self._posters[size] = buffer.getvalue()
+        return self._posters[size]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type, headers=None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.state.lock:
+            self.server.state.bytes_sent += len(body)
+
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.state.started()
+        try:
+            self.route()
+        finally:
+            self.server.state.finished()
+
+    def route(self):
+        state = self.server.state
+        path = self.path.split('?', 1)[0]
+        if state.latency:
+            time.sleep(state.latency)
+
+        match = FEED_PATH.match(path)
+        if match:
+            state.count('rss')
+            body = state.feed(match.group(1))
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                state.count('rss_not_modified')
+                return self.send_empty(304, {'ETag': etag})
+            return self.send_body(body, 'application/rss+xml; charset=utf-8', {'ETag': etag})
+
+        match = MOVIE_PATH.match(path)
+        if match:
+            media_type, tmdb_id = match.group(1), int(match.group(2))
+            calls = state.count(f'tmdb_{media_type}')
+            if state.throttle_every and calls % state.throttle_every == 0:
+                state.count('tmdb_throttled')
+                return self.send_empty(429, {'Retry-After': '0'})
+            if tmdb_id in state.fail_ids:
+                state.count('tmdb_failed')
+                return self.send_empty(500)
+            body = json.dumps(SYNTHETIC_TMDB[media_type](tmdb_id)).encode()
+            return self.send_body(body, 'application/json')
+
+        if path == SEARCH_PATH:
+            state.count('tmdb_search')
+            query = parse_qs(urlsplit(self.path).query).get('query', [''])[0]
+            match = SYNTHETIC_TITLE.fullmatch(query)
+            results = [{'id': int(match.group(1)), 'title': query}] if match else []
+            return self.send_body(json.dumps({'results': results}).encode(), 'application/json')
+
+        match = POSTER_PATH.match(path)
+        if match:
+            state.count('poster')
+            return self.send_body(state.poster(match.group(1)), 'image/jpeg')
+
+        state.count('not_found')
+        self.send_empty(404)
+
+
+class StubServer:
+    def __init__(self, host='127.0.0.1', port=0, **state_kwargs):
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = StubState(**state_kwargs)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def env(self):
+        return {
+            'LETTERBOXD_URL': self.url,
+            'TMDB_API_URL': f'{self.url}/3',
+            'TMDB_IMAGE_URL': f'{self.url}/t/p',
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve stub Letterboxd/TMDB endpoints for local runs')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--entries', type=int, default=50, help='default number of diary entries per feed')
+    parser.add_argument('--year', type=int, default=2024)
+    parser.add_argument('--throttle-every', type=int, default=0, help='answer every Nth TMDB call with a 429')
+    parser.add_argument('--tv-every', type=int, default=0, help='make every Nth diary entry a TV show')
+    parser.add_argument('--fail-ids', type=int, nargs='*', default=[], help='TMDB ids that always answer 500')
+    parser.add_argument('--latency-ms', type=float, default=0, help='delay added to every response')
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, entries=args.entries, year=args.year, throttle_every=args.throttle_every,
+                        tv_every=args.tv_every, fail_ids=args.fail_ids, latency=args.latency_ms / 1000)
+    for name, value in server.env().items():
+        print(f'export {name}={value}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.stub_server import StubServer
+
+# End-to-end benchmark suite against the local stub server:
+#   python -m benchmarks.suite --out results.json
+#   python -m benchmarks.suite --out new.json --baseline results.json
+# Every size runs in a fresh process with an empty cache directory, so the
+# "cold" numbers include every TMDB and poster request and nothing carries
+# over between sizes. The stub serves deterministic synthetic feeds and TMDB
+# responses (see benchmarks/fixtures.py), so runs on the same machine compare.
+# Workers never download fonts: without the vendored fonts in static/fonts the
+# poster is drawn with Pillow's default font, the results record that, and
+# poster timings are only compared between runs that drew with the same fonts.
+# --no-poster leaves the poster out. Any other failure fails the run.
+
+SIZES = [10, 100, 1000, 10000]
+YEAR = 2024
+# a metric only counts as a regression if it's this much slower and by at least MIN_DELTA_SECONDS
+TOLERANCE = 0.25
+MIN_DELTA_SECONDS = 0.005
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def once(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run_size(entries, year, repeat, poster_metrics=True):
+    # runs in the worker process, after the stub URLs and cache dir are in the environment
+    from app.fonts import all_fonts_loaded, load_fonts
+    from app.movie_data import get_movie_data_from_rss_feed, rss_feed_url
+    from app.poster_generator import create_poster
+    from app.stats import YearInFilmStats
+    from app.visualisations import (
+        altair_spec_json, build_bar_chart, build_donut_chart, build_language_pie_chart, render_treemap_png,
+    )
+
+    url = rss_feed_url(f'bench-{entries}')
+    result = {}
+    movie_df, result['feed_cold_s'] = once(lambda: get_movie_data_from_rss_feed(url, year))
+    result['feed_warm_s'] = best_time(lambda: get_movie_data_from_rss_feed(url, year), repeat)
+    result['rows'] = len(movie_df)
+
+    stats = YearInFilmStats.from_frame(movie_df, year)
+    result['aggregates_s'] = best_time(lambda: YearInFilmStats.from_frame(movie_df, year), repeat)
+
+    def render_charts():
+        # the uncached work behind the dashboard charts
+        genre_counts_df = stats.genre_counts.reset_index()
+        render_treemap_png(genre_counts_df)
+        altair_spec_json(build_donut_chart(genre_counts_df))
+        altair_spec_json(build_bar_chart(stats.rating_counts))
+        altair_spec_json(build_language_pie_chart(stats.language_counts))
+    result['charts_s'] = best_time(render_charts, repeat)
+
+    if poster_metrics:
+        load_fonts()
+        result['poster_fonts'] = 'vendored' if all_fonts_loaded() else 'default'
+
+        def poster(cache=False):
+            return create_poster(f'bench-{entries}', movie_df, year, stats.top3, stats=stats, cache=cache).getvalue()
+        png, result['poster_cold_s'] = once(poster)
+        result['poster_warm_s'] = best_time(poster, repeat)
+        result['poster_bytes'] = len(png)
+        # stories drawn with the default font are never cached, so there's no cached timing for them
+        if all_fonts_loaded():
+            # the first cached call renders and stores, the rest are served from the story cache
+            poster(cache=True)
+            result['poster_cached_s'] = best_time(lambda: poster(cache=True), repeat)
+
+    result['peak_rss_mib'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def spawn_size(server, entries, year, repeat, poster_metrics=True):
+    with tempfile.TemporaryDirectory(prefix='letterboxdbi-suite-') as cache_dir:
+        env = dict(os.environ, **server.env(), LETTERBOXDBI_CACHE_DIR=cache_dir, LETTERBOXDBI_TRACING='0',
+                   FONT_DOWNLOAD='0')
+        before = dict(server.state.counts)
+        command = [sys.executable, '-m', 'benchmarks.suite', '--worker', '--sizes', str(entries),
+                   '--year', str(year), '--repeat', str(repeat)]
+        if not poster_metrics:
+            command.append('--no-poster')
+        worker = subprocess.run(command, env=env, capture_output=True, text=True)
+    if worker.returncode != 0:
+        sys.exit(f'{entries} entries failed:\n{worker.stderr}')
+    output = worker.stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['upstream_requests'] = {
+        route: count - before.get(route, 0) for route, count in server.state.counts.items()
+        if count - before.get(route, 0)
+    }
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for size, metrics in results['sizes'].items():
+        old_metrics = baseline['sizes'].get(size, {})
+        # a poster drawn with other fonts isn't the same work
+        same_fonts = metrics.get('poster_fonts') == old_metrics.get('poster_fonts')
+        for name, value in metrics.items():
+            old_value = old_metrics.get(name)
+            if not name.endswith('_s') or not isinstance(old_value, (int, float)) or not old_value:
+                continue
+            if name.startswith('poster_') and not same_fonts:
+                continue
+            ratio = value / old_value
+            flag = ratio > 1 + tolerance and value - old_value > MIN_DELTA_SECONDS
+            print(f'{size:>6} {name:<14} {old_value * 1e3:>10.2f} ms -> {value * 1e3:>10.2f} ms  x{ratio:.2f}'
+                  + ('  REGRESSION' if flag else ''))
+            if flag:
+                regressions.append((size, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Feed, aggregate, chart and poster timings against a local stub')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='diary entries per synthetic user')
+    parser.add_argument('--year', type=int, default=YEAR)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per warm measurement, the best is kept')
+    parser.add_argument('--out', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='earlier results to compare against; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--no-poster', action='store_true', help='leave the story poster out of the run')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_size(args.sizes[0], args.year, args.repeat, not args.no_poster)))
+        return
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'year': args.year,
+        'repeat': args.repeat,
+        'poster': not args.no_poster,
+        'sizes': {},
+    }
+    with StubServer(year=args.year) as server:
+        for entries in args.sizes:
+            result = spawn_size(server, entries, args.year, args.repeat, not args.no_poster)
+            results['sizes'][str(entries)] = result
+            poster = (f"poster cold {result['poster_cold_s']:.3f}s warm {result['poster_warm_s']:.3f}s "
+                      f"({result['poster_fonts']} fonts)" if 'poster_cold_s' in result else 'no poster')
+            print(f"{entries:>6} entries: feed cold {result['feed_cold_s']:.3f}s warm {result['feed_warm_s']:.3f}s, "
+                  f"aggregates {result['aggregates_s'] * 1e3:.1f}ms, charts {result['charts_s'] * 1e3:.1f}ms, "
+                  f"{poster}, peak RSS {result['peak_rss_mib']} MiB")
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'wrote {args.out}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
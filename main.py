@@ -1,10 +1,13 @@
 import streamlit as st
 
 from app.dashboard import main, set_page_style
+from app.warmup import start_warmup
 
 def run_app():
     set_page_style()
     main()
+    # after the page is sent, so the form never waits on the imports
+    start_warmup()
 
 if __name__ == "__main__":
-    run_app()
\ No newline at end of file
+    run_app()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+import pytest
+
+# app modules read their settings at import time, keep the tests off the real
+# cache directory and the network
+os.environ['LETTERBOXDBI_CACHE_DIR'] = tempfile.mkdtemp(prefix='letterboxdbi-test-')
+os.environ.setdefault('LETTERBOXDBI_TRACING', '0')
+os.environ.setdefault('FONT_DOWNLOAD', '0')
+
+# app modules imported after the settings above
+from app import http_client, movie_data, tmdb_cache  # noqa: E402
+from benchmarks.stub_server import StubServer  # noqa: E402
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    # the app pointed at a local stub, with its own TMDB cache and rate limit budget
+    servers = []
+
+    def start(**state_kwargs):
+        server = StubServer(**state_kwargs).start()
+        servers.append(server)
+        monkeypatch.setattr(movie_data, 'LETTERBOXD_URL', server.url)
+        monkeypatch.setattr(movie_data, 'TMDB_API_URL', f'{server.url}/3')
+        monkeypatch.setattr(movie_data, 'TMDB_IMAGE_URL', f'{server.url}/t/p')
+        monkeypatch.setattr(tmdb_cache, '_cache', tmdb_cache.TMDBCache(str(tmp_path / 'tmdb.sqlite3')))
+        monkeypatch.setattr(movie_data, 'tmdb_limiter', http_client.TokenBucket(movie_data.TMDB_RATE_LIMIT,
+                                                                                movie_data.TMDB_RATE_BURST))
+        # failing ids are retried before they're given up on, don't wait seconds for it
+        monkeypatch.setattr(http_client, 'BACKOFF_BASE', 0.01)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,35 @@
+import os
+
+from app.diary_history import HistoryImport
+
+HEADER = 'Date,Name,Year,Letterboxd URI,Rating,Rewatch,Tags,Watched Date\n'
+
+
+def write_export(path, rows, mtime):
+    with open(path, 'w') as f:
+        f.write(HEADER + ''.join(rows))
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_checkpoint_resumes_the_same_export(tmp_path):
+    diary_csv = str(tmp_path / 'diary.csv')
+    write_export(diary_csv, ['2024-01-01,Film A,2020,a,4,,,2024-01-01\n'], 1_000_000_000)
+    history = HistoryImport('resumer', 2024, directory=str(tmp_path / 'history'))
+    state = history.load_state(diary_csv)
+    state['rows_done'] = 1
+    history.save_state(state)
+
+    assert history.load_state(diary_csv)['rows_done'] == 1
+
+
+def test_new_export_of_the_same_size_starts_over(tmp_path):
+    diary_csv = str(tmp_path / 'diary.csv')
+    write_export(diary_csv, ['2024-01-01,Film A,2020,a,4,,,2024-01-01\n'], 1_000_000_000)
+    history = HistoryImport('reexporter', 2024, directory=str(tmp_path / 'history'))
+    state = history.load_state(diary_csv)
+    state['rows_done'] = 1
+    history.save_state(state)
+
+    write_export(diary_csv, ['2024-01-02,Film B,2021,b,3,,,2024-01-02\n'], 2_000_000_000)
+
+    assert history.load_state(diary_csv)['rows_done'] == 0
@@ -0,0 +1,67 @@
+from app.diary_store import sync_diary
+from app.movie_data import rss_feed_url
+
+ITEM = """<item>
+<guid isPermaLink="false">letterboxd-review-{guid}</guid>
+<pubDate>{published} Jan 2024 12:00:00 +0000</pubDate>
+<letterboxd:watchedDate>2024-01-{published:02d}</letterboxd:watchedDate>
+<letterboxd:rewatch>No</letterboxd:rewatch>
+<letterboxd:filmTitle>Film {guid}</letterboxd:filmTitle>
+<letterboxd:memberRating>{rating}</letterboxd:memberRating>
+<tmdb:movieId>{guid}</tmdb:movieId>
+<description><![CDATA[ <p><img src="poster.jpg"/></p> <p>{review}</p> ]]></description>
+</item>"""
+
+
+def feed(entries):
+    # entries: (guid, day published, rating, review), newest first like the real feed
+    items = ''.join(ITEM.format(guid=guid, published=published, rating=rating, review=review)
+                    for guid, published, rating, review in entries)
+    return ('<rss xmlns:letterboxd="https://letterboxd.com" xmlns:tmdb="https://themoviedb.org"><channel>'
+            f'{items}</channel></rss>').encode()
+
+
+def serve(server, username, entries):
+    server.state._feeds[username] = feed(entries)
+
+
+def ratings(diary_df):
+    return dict(zip(diary_df['tmdb_id'].astype(int), diary_df['memberRating'].astype(float)))
+
+
+def test_edited_entries_are_picked_up(stub):
+    server = stub()
+    serve(server, 'editor', [(102, 3, 4.0, 'Watched on Wednesday'), (101, 2, 3.0, 'Watched on Tuesday')])
+    sync_diary('editor', rss_feed_url('editor'))
+
+    serve(server, 'editor', [(102, 3, 2.5, 'Watched on Wednesday'), (101, 2, 3.0, 'Changed my mind, loved it.')])
+    diary_df = sync_diary('editor', rss_feed_url('editor'))
+
+    assert ratings(diary_df) == {101: 3.0, 102: 2.5}
+    assert diary_df.loc[diary_df['tmdb_id'].astype(int) == 101, 'description'].item() == 'Changed my mind, loved it.'
+
+
+def test_unchanged_entries_are_not_looked_up_again(stub):
+    server = stub()
+    serve(server, 'steady', [(102, 3, 4.0, 'Watched on Wednesday'), (101, 2, 3.0, 'Watched on Tuesday')])
+    sync_diary('steady', rss_feed_url('steady'))
+    lookups = server.state.counts['tmdb_movie']
+
+    serve(server, 'steady', [(103, 4, 5.0, 'New'), (102, 3, 4.0, 'Watched on Wednesday'),
+                             (101, 2, 3.0, 'Watched on Tuesday')])
+    diary_df = sync_diary('steady', rss_feed_url('steady'))
+
+    assert ratings(diary_df) == {101: 3.0, 102: 4.0, 103: 5.0}
+    assert server.state.counts['tmdb_movie'] == lookups + 1
+
+
+def test_deleted_entries_are_dropped_and_older_ones_kept(stub):
+    server = stub()
+    serve(server, 'pruner', [(103, 4, 4.0, 'c'), (102, 3, 3.0, 'b'), (101, 2, 2.0, 'a')])
+    sync_diary('pruner', rss_feed_url('pruner'))
+
+    # 103 was deleted; 101 fell out of the feed's window as 104 and 105 were logged
+    serve(server, 'pruner', [(105, 6, 5.0, 'e'), (104, 5, 4.5, 'd'), (102, 3, 3.0, 'b')])
+    diary_df = sync_diary('pruner', rss_feed_url('pruner'))
+
+    assert sorted(ratings(diary_df)) == [101, 102, 104, 105]
@@ -0,0 +1,36 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.files import WriteCounter, prune_directory, write_bytes
+
+
+def test_threads_writing_the_same_file_dont_collide(tmp_path):
+    path = str(tmp_path / 'poster.png')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: write_bytes(path, bytes([i]) * 1000), range(64)))
+    assert os.listdir(tmp_path) == ['poster.png']
+    with open(path, 'rb') as f:
+        assert len(set(f.read())) == 1
+
+
+def test_prune_removes_the_oldest_files_first(tmp_path):
+    for i in range(5):
+        path = tmp_path / str(i // 2) / f'{i}.bin'
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (1000 + i, 1000 + i))
+    prune_directory(str(tmp_path), max_bytes=250)
+    assert sorted(name for _, _, names in os.walk(tmp_path) for name in names) == ['3.bin', '4.bin']
+
+
+def test_prune_removes_expired_files_under_the_size_bound(tmp_path):
+    (tmp_path / 'old.bin').write_bytes(b'x')
+    os.utime(tmp_path / 'old.bin', (1000, 1000))
+    (tmp_path / 'new.bin').write_bytes(b'x')
+    prune_directory(str(tmp_path), max_bytes=1000, ttl=60)
+    assert os.listdir(tmp_path) == ['new.bin']
+
+
+def test_write_counter_is_due_every_nth_call():
+    counter = WriteCounter(3)
+    assert [counter.due() for _ in range(7)] == [False, False, True, False, False, True, False]
@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_api_loads_without_the_ui_modules():
+    # the headless API shouldn't pay for streamlit, the chart libraries or bs4
+    code = ("import sys, app.api; "
+            "print(' '.join(m for m in ('streamlit', 'altair', 'matplotlib', 'bs4') if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, check=True, capture_output=True, text=True).stdout
+    assert loaded.strip() == ''
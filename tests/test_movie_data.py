@@ -0,0 +1,31 @@
+import io
+
+from app.movie_data import iter_rss_items, take_year
+
+ITEM = """
+<item>
+  <guid>letterboxd-review-{guid}</guid>
+  <letterboxd:watchedDate>{watched}</letterboxd:watchedDate>
+  <letterboxd:filmTitle>Film {guid}</letterboxd:filmTitle>
+  <tmdb:movieId>{guid}</tmdb:movieId>
+  <description><![CDATA[<p><img src="poster.jpg"/></p> <p>Watched on {watched}.</p>]]></description>
+</item>"""
+
+
+def feed(*watched_dates):
+    items = ''.join(ITEM.format(guid=i, watched=watched) for i, watched in enumerate(watched_dates))
+    return io.BytesIO(
+        '<rss xmlns:letterboxd="https://letterboxd.com" xmlns:tmdb="https://themoviedb.org">'
+        f'<channel>{items}</channel></rss>'.encode()
+    )
+
+
+def test_take_year_keeps_entries_after_a_backfilled_one():
+    # ordered by when they were logged, the 2023 viewing was logged in between
+    items = iter_rss_items(feed('2025-03-01', '2023-06-01', '2025-02-01'))
+    assert [item['logDate'] for item in take_year(items, 2025)] == ['2025-03-01', '2025-02-01']
+
+
+def test_take_year_skips_entries_without_a_date():
+    items = [{'logDate': None}, {'logDate': '2024-12-31'}, {'logDate': '2025-01-01'}]
+    assert list(take_year(items, 2024)) == [{'logDate': '2024-12-31'}]
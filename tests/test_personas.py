@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from app.personas import PersonaModel, get_model
+from app.schema import build_movie_frame, reviewed_mask
+from benchmarks.fixtures import synthetic_merged_frame
+
+
+def diary(n, year=2024, seed=0):
+    return build_movie_frame(synthetic_merged_frame(max(n, 1), year=year, seed=seed)).iloc[:n]
+
+
+@pytest.mark.filterwarnings('error::FutureWarning')
+@pytest.mark.parametrize('n', [0, 1, 40])
+def test_score_is_weighted_share_minus_baseline(n):
+    year = 2023
+    df = diary(n, year)
+    model = get_model()
+    matrix = model.feature_matrix(df, year)
+    shares = matrix.mean(axis=0) if n else np.zeros(len(model.features))
+    scores = model.score(df, year)
+    assert list(scores.index) == model.names
+    assert np.allclose(scores.to_numpy(), shares @ model.weights - model.baselines, atol=1e-4)
+
+
+def test_reviewed_feature_matches_review_count():
+    df = diary(60)
+    model = PersonaModel([{'name': 'Wordsmith', 'rules': {'reviewed': 1.0}}])
+    scores = model.score(df, 2024)
+    assert scores['Wordsmith'] == pytest.approx(reviewed_mask(df['description']).mean(), abs=1e-4)
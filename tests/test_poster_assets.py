@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app import poster_assets
+from app.poster_assets import load_thumbnails
+
+SIZE = (200, 300)
+RADIUS = 15
+
+
+def test_sessions_sharing_a_film_all_get_its_thumbnail(stub, monkeypatch, tmp_path):
+    server = stub()
+    monkeypatch.setattr(poster_assets, 'THUMBNAIL_DIR', str(tmp_path / 'thumbnails'))
+    poster_urls = [f'{server.url}/t/p/w500/poster{tmdb_id}.jpg' for tmdb_id in range(100, 110)]
+    # six sessions at once with the same top 3
+    sessions = [poster_urls[i:i + 3] for i in range(0, len(poster_urls) - 2) for _ in range(6)]
+    with ThreadPoolExecutor(max_workers=24) as executor:
+        results = list(executor.map(lambda urls: load_thumbnails(urls, SIZE, RADIUS), sessions))
+    assert all(poster is not None and poster.size == SIZE for posters in results for poster in posters)
+    files = [path for path in (tmp_path / 'thumbnails').rglob('*') if path.is_file()]
+    assert len(files) == len(poster_urls)
+
+
+def test_thumbnail_directory_is_pruned(stub, monkeypatch, tmp_path):
+    server = stub()
+    monkeypatch.setattr(poster_assets, 'THUMBNAIL_DIR', str(tmp_path / 'thumbnails'))
+    monkeypatch.setattr(poster_assets, '_writes', poster_assets.WriteCounter(2))
+    prune = poster_assets.prune_thumbnails
+    monkeypatch.setattr(poster_assets, 'prune_thumbnails', lambda: prune(max_bytes=1))
+    load_thumbnails([f'{server.url}/t/p/w500/poster{tmdb_id}.jpg' for tmdb_id in range(100, 104)], SIZE, RADIUS)
+    assert not [path for path in (tmp_path / 'thumbnails').rglob('*') if path.is_file()]
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app import fonts, poster_assets, poster_generator, poster_output
+from app.poster_generator import create_poster
+from app.schema import build_movie_frame
+from app.stats import YearInFilmStats
+from benchmarks.fixtures import synthetic_merged_frame
+
+YEAR = 2024
+
+
+@pytest.fixture
+def no_fonts(monkeypatch, tmp_path):
+    # neither vendored nor cached, and no way to download them
+    monkeypatch.setattr(fonts, 'FONT_DIR', str(tmp_path / 'static'))
+    monkeypatch.setattr(fonts, 'FONT_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(fonts, '_fonts', None)
+    fonts.font_path.cache_clear()
+    poster_generator.base_template.cache_clear()
+    yield
+    fonts.font_path.cache_clear()
+    poster_generator.base_template.cache_clear()
+
+
+@pytest.fixture
+def story_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(poster_output, 'STORY_DIR', str(tmp_path / 'stories'))
+    return tmp_path / 'stories'
+
+
+def year_stats():
+    movie_df = build_movie_frame(synthetic_merged_frame(30, year=YEAR))
+    return movie_df, YearInFilmStats.from_frame(movie_df, YEAR)
+
+
+def test_story_renders_without_fonts_and_is_not_cached(no_fonts, story_dir):
+    movie_df, stats = year_stats()
+    poster = create_poster('offline', movie_df, YEAR, stats.top3, stats=stats, fmt='png')
+    assert Image.open(io.BytesIO(poster.getvalue())).size == (poster_generator.width, poster_generator.height)
+    assert not fonts.all_fonts_loaded()
+    assert not story_dir.exists() or not any(story_dir.rglob('*.png'))
+
+
+def test_story_with_a_placeholder_poster_is_not_cached(stub, no_fonts, story_dir, monkeypatch, tmp_path):
+    server = stub()
+    monkeypatch.setattr(poster_generator, 'all_fonts_loaded', lambda: True)
+    monkeypatch.setattr(poster_assets, 'THUMBNAIL_DIR', str(tmp_path / 'thumbnails'))
+    movie_df, stats = year_stats()
+    top3 = [{**movie, 'image': f'{server.url}/t/p/w500/poster{100 + i}.jpg'} for i, movie in enumerate(stats.top3)]
+    missing = [*top3[:2], {**top3[2], 'image': f'{server.url}/t/p/w500/missing.jpg'}]
+
+    create_poster('alice', movie_df, YEAR, missing, stats=stats, fmt='png')
+    assert not story_dir.exists() or not any(story_dir.rglob('*.png'))
+
+    create_poster('alice', movie_df, YEAR, top3, stats=stats, fmt='png')
+    assert len(list(story_dir.rglob('*.png'))) == 1
@@ -0,0 +1,47 @@
+import io
+
+from app import http_client
+from app.movie_data import fetch_tmdb_movies, get_movie_data_from_rss_feed, iter_rss_items, rss_feed_url
+
+YEAR = 2024
+
+
+def movie_keys(n):
+    return [(str(tmdb_id), 'movie') for tmdb_id in range(100, 100 + n)]
+
+
+def test_workers_stay_within_the_concurrency_limit(stub):
+    server = stub(latency=0.05)
+    records = fetch_tmdb_movies(movie_keys(16), max_workers=4)
+    assert all(record is not None for record in records)
+    assert server.state.counts['tmdb_movie'] == 16
+    assert 1 < server.state.max_in_flight <= 4
+
+
+def test_requests_per_host_stay_within_the_semaphore(stub):
+    server = stub(latency=0.05)
+    fetch_tmdb_movies(movie_keys(20), max_workers=http_client.MAX_CONCURRENCY_PER_HOST * 2)
+    assert server.state.max_in_flight <= http_client.MAX_CONCURRENCY_PER_HOST
+
+
+def test_throttled_requests_are_retried_after_retry_after(stub):
+    server = stub(throttle_every=3)
+    records = fetch_tmdb_movies(movie_keys(12), max_workers=4)
+    assert [record['id'] for record in records] == [tmdb_id for tmdb_id, _ in movie_keys(12)]
+    throttled = server.state.counts['tmdb_throttled']
+    assert throttled > 0
+    # every 429 cost exactly one extra request
+    assert server.state.counts['tmdb_movie'] == 12 + throttled
+
+
+def test_failing_id_is_isolated_from_the_rest_of_the_diary(stub):
+    server = stub(entries=40, year=YEAR)
+    items = list(iter_rss_items(io.BytesIO(server.state.feed('alice'))))
+    failing_id = int(items[0]['tmdb_id'])
+    server.state.fail_ids.add(failing_id)
+
+    movie_df = get_movie_data_from_rss_feed(rss_feed_url('alice'), YEAR)
+
+    assert server.state.counts['tmdb_failed'] > 0
+    expected = sorted(item['guid'] for item in items if int(item['tmdb_id']) != failing_id)
+    assert sorted(movie_df['guid']) == expected
@@ -0,0 +1,42 @@
+import sqlite3
+
+from app.tmdb_cache import TMDBCache
+
+
+def accessed(cache, key):
+    with sqlite3.connect(cache.path) as conn:
+        return conn.execute('SELECT accessed FROM metadata WHERE key = ?', (key,)).fetchone()[0]
+
+
+def test_hits_are_reads_until_the_access_times_are_flushed(tmp_path):
+    cache = TMDBCache(str(tmp_path / 'tmdb.sqlite3'))
+    cache.set_metadata('movie', 1, {'id': '1'})
+    stored = accessed(cache, 'movie:1')
+    conn = cache._connect()
+    changes = conn.total_changes
+
+    assert cache.get_metadata('movie', 1) == {'id': '1'}
+    assert conn.total_changes == changes
+    assert accessed(cache, 'movie:1') == stored
+
+    cache.flush_access_times()
+    assert accessed(cache, 'movie:1') > stored
+
+
+def test_eviction_keeps_the_entries_read_since_the_last_flush(tmp_path):
+    cache = TMDBCache(str(tmp_path / 'tmdb.sqlite3'), max_entries=2)
+    for tmdb_id in range(3):
+        cache.set_metadata('movie', tmdb_id, {'id': str(tmdb_id)})
+    # the oldest write is the most recent read
+    cache.get_metadata('movie', 0)
+    cache.evict()
+    assert cache.get_metadata('movie', 0) == {'id': '0'}
+    assert cache.get_metadata('movie', 1) is None
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = TMDBCache(str(tmp_path / 'tmdb.sqlite3'), ttl=1)
+    cache.set_metadata('movie', 1, {'id': '1'})
+    with sqlite3.connect(cache.path) as conn:
+        conn.execute("UPDATE metadata SET created = created - 10")
+    assert cache.get_metadata('movie', 1) is None